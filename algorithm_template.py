@@ -1,13 +1,17 @@
+from collections import OrderedDict, deque
 from processstate import ProcessState
 
 ### MEMORY ###
 
 """
 You can initialize the freelist here, if you want to.
+The freelist starts out empty. It acts like a list of free frames, but adding
+a frame that is already in it raises FrameDoubleFree. append() and pop() are
+fast however many frames there are, and so is remove() (amortized); indexing,
+insert(), sort() and the like work too, but cost what they would on a list.
 """
 def initialize_freelist(freelist, memsize):
-    for x in range(memsize):
-        freelist.append(x)
+    freelist.extend(range(memsize))
 
 """
 Use the freelist to find an unallocated block of memory and return its address.
@@ -26,26 +30,32 @@ def free_memory(freelist, addr):
 """
 What the 'state' param in on_page_created() should look like initially.
 Preferably only use Python built-in data types and list/set/dict.
+The default FIFO keeps resident pages in load order in an OrderedDict,
+so loading, evicting and freeing a page are all O(1).
 """
 def initialize_pagemanager_state():
-    return []
+    return OrderedDict()
 
 """
 Called after a page is placed into memory.
 The intention is for you to update your 'state' to keep track of evictees.
 """
 def on_page_loaded(pageid, state):
-    state.append(pageid)
+    state[pageid] = None
 
 """
 Called when a page's memory is freed, be it by evicting
 or by being deallocated.
 """
 def on_page_freed(pageid, state):
-    try:
-        state.remove(pageid)
-    except:
-        pass
+    state.pop(pageid, None)
+
+"""
+Optional. Called when a page is accessed while already in memory, i.e. on a hit.
+Leave it undefined if you don't need it, so hits stay free for the page manager.
+def on_page_accessed(pageid, state):
+    pass
+"""
 
 """
 When a process wishes to access data in a page, the page must loaded into memory.
@@ -62,35 +72,60 @@ def handle_pagefault(pageid, state, evict_page, mem_used, mem_size):
     if len(state) < mem_size:  # If there's free memory, just load
         return
     # otherwise, evict & load
-    to_evict = state.pop(0)  # FIFO
+    to_evict, _ = state.popitem(last=False)  # FIFO
     evict_page(to_evict)
 
 ### PROCESS SCHEDULING ###
 
+"""
+Every CPU has its own run queue, which is the `scheduler` these functions
+are given, so each CPU runs its own copy of the algorithm.
+"""
+
+"""
+Round robin. scheduler.q holds the ready processes in the order they will
+run: picking one moves it from the front to the back.
+scheduler.ready holds every process on this CPU that can run, by pid, if you need it.
+"""
 def init_scheduler(scheduler):
-    scheduler.q = []
-    scheduler.last = None
+    scheduler.q = deque()
 
+"""
+Called when a process is first ready to run.
+"""
 def admit_process(scheduler, process):
     scheduler.q.append(process)
 
+"""
+Return the process to run for the next slice, or None if none are ready.
+It must be one of scheduler.ready. Round robin takes the one at the front
+of scheduler.q and moves it to the back, where it stays while it runs.
+"""
 def pick_process(scheduler):
-    # for i, process in enumerate(scheduler.q):
-    #     if process.state == ProcessState.READY:
-    #         schedule_me = process
-    #         break
-    # return process
-    schedule_me = None
-    index = None
-    for i, process in enumerate(scheduler.q):
-        if process.state == ProcessState.READY:
-            schedule_me = process
-            index = i
-            break
-    if schedule_me is None:
+    if not scheduler.q:
         return None
-    scheduler.q.append(scheduler.q.pop(index))
-    return schedule_me
+    scheduler.q.rotate(-1)
+    return scheduler.q[-1]
 
+"""
+Called when a process finishes, after it was picked to run.
+"""
 def terminate_process(scheduler, process):
-    scheduler.q.remove(process)
+    # It was just picked, so it's at the back
+    if scheduler.q[-1] is process:
+        scheduler.q.pop()
+    else:
+        scheduler.q.remove(process)
+
+"""
+Optional. Called when a process that was picked to run blocks, waiting for a
+resource, and when it is woken up with the resource. Until then it isn't
+in scheduler.ready, and must not be picked.
+If left undefined, blocking is reported to terminate_process and waking up to
+admit_process instead, as the process leaves and rejoins the ready processes.
+def block_process(scheduler, process):
+    pass
+
+def wake_process(scheduler, process):
+    pass
+"""
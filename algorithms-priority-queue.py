@@ -1,5 +1,3 @@
-import heapq
-
 from processstate import ProcessState
 
 ### MEMORY ###
@@ -90,50 +88,6 @@ def handle_pagefault(pageid, state, evict_page, mem_used, mem_size):
 
 ### PROCESS SCHEDULING ###
 
-def init_scheduler(scheduler):
-    scheduler.pq = []
-    scheduler.last = None
-
-
-class Node:
-    def __init__(self, process, priority):
-        self.process = process
-        self.priority = priority
-
-    def __lt__(self, other):
-        if self.priority < other.priority:
-            return True
-        else:
-            return False
-
-
-def admit_process(scheduler, process):
-    priority = len(process.program)
-    heapq.heappush(scheduler.pq, Node(process, priority))
-
-
-def pick_process(scheduler):
-    # for i, process in enumerate(scheduler.q):
-    #     if process.state == ProcessState.READY:
-    #         schedule_me = process
-    #         break
-    # return process
-    schedule_me = None
-    push_list = []
-
-    for i in range(len(scheduler.pq)):
-        node = heapq.heappop(scheduler.pq)
-        push_list.append(node)
-        if node.process.state == ProcessState.READY:
-            schedule_me = node.process
-            break
-    for e in push_list:
-        heapq.heappush(scheduler.pq, e)
-
-    return schedule_me
-
-
-def terminate_process(scheduler, process):
-    for i, node in enumerate(scheduler.pq):
-        if node.process == process:
-            scheduler.pq.pop(i)
+# Shortest program first, on an indexed heap, so picking and terminating
+# don't have to search the queue for ready processes.
+from algorithms_priority import init_scheduler, admit_process, pick_process, terminate_process
@@ -2,12 +2,6 @@ import sys
 import os
 from importlib import import_module
 
-_defaults = import_module('algorithm_template')
-if 'AOS_ALGORITHMS' in os.environ:
-    _algorithms = import_module(os.environ['AOS_ALGORITHMS'])
-else:
-    _algorithms = _defaults
-
 ALGO_NAMES = [
     'initialize_freelist',
     'allocate_memory',
@@ -22,9 +16,54 @@ ALGO_NAMES = [
     'terminate_process'
 ]
 
+# Hooks that algorithms may leave out entirely. If neither the chosen module
+# nor the defaults define one, it is set to None so callers can skip it.
+OPTIONAL_ALGO_NAMES = [
+    'on_page_accessed',
+    'block_process',
+    'wake_process'
+]
+
+_defaults = import_module('algorithm_template')
+
+
+"""
+A bundle of the algorithms a single simulation uses, taken from a module.
+Anything the module doesn't define falls back to algorithm_template.
+
+PhysicalMemory, PageManager and Scheduler take their functions from the
+bundle they are given, so simulations using different bundles can run side
+by side in one process. They default to the bundle named by AOS_ALGORITHMS.
+:param module: A module, or the name of one to import. Defaults to algorithm_template.
+"""
+class Algorithms:
+    def __init__(self, module=None):
+        if module is None:
+            module = _defaults
+        elif isinstance(module, str):
+            module = import_module(module)
+        self.name = module.__name__
+        for algo in ALGO_NAMES:
+            setattr(self, algo, getattr(module, algo, getattr(_defaults, algo)))
+        for algo in OPTIONAL_ALGO_NAMES:
+            setattr(self, algo, getattr(module, algo, getattr(_defaults, algo, None)))
+
+    def __repr__(self):
+        return f'Algorithms({self.name!r})'
+
+
+def get_algorithms(algorithms=None):
+    # An Algorithms bundle from a bundle, module, module name, or None for the default.
+    if algorithms is None:
+        return default
+    if isinstance(algorithms, Algorithms):
+        return algorithms
+    return Algorithms(algorithms)
+
+
+default = Algorithms(os.environ.get('AOS_ALGORITHMS'))
+
+# The default bundle's functions are also available from this module, as they used to be
 _module = sys.modules[__name__]
-for algo in ALGO_NAMES:
-    try:
-        setattr(_module, algo, getattr(_algorithms, algo))
-    except AttributeError:
-        setattr(_module, algo, getattr(_defaults, algo))
+for algo in ALGO_NAMES + OPTIONAL_ALGO_NAMES:
+    setattr(_module, algo, getattr(default, algo))
@@ -0,0 +1,66 @@
+"""
+Clock (second chance) page replacement.
+Set AOS_ALGORITHMS=algorithms_clock to use it. Everything other than page
+management falls back to algorithm_template.
+"""
+
+### PAGE MANAGEMENT ###
+
+"""
+Resident pages sit in a circular list of slots, which a hand sweeps over
+looking for a page whose reference bit is clear. Freed slots are reused by
+the next page loaded, so loading and freeing are O(1), and evicting is
+amortized O(1).
+    - 'slots': The ring of pageids, with None for a free slot.
+    - 'where': pageid -> index of its slot.
+    - 'ref': pageid -> reference bit.
+    - 'free': Indices of free slots.
+    - 'hand': Index of the next slot to inspect.
+"""
+def initialize_pagemanager_state():
+    return {'slots': [], 'where': {}, 'ref': {}, 'free': [], 'hand': 0}
+
+def on_page_loaded(pageid, state):
+    if state['free']:
+        index = state['free'].pop()
+        state['slots'][index] = pageid
+    else:
+        index = len(state['slots'])
+        state['slots'].append(pageid)
+    state['where'][pageid] = index
+    state['ref'][pageid] = True
+
+"""
+A hit sets the page's reference bit, giving it a second chance.
+"""
+def on_page_accessed(pageid, state):
+    state['ref'][pageid] = True
+
+def on_page_freed(pageid, state):
+    index = state['where'].pop(pageid, None)
+    if index is None:
+        return
+    del state['ref'][pageid]
+    state['slots'][index] = None
+    state['free'].append(index)
+
+"""
+Sweep the hand forward, clearing reference bits, until it finds a page
+that hasn't been referenced since the last sweep. Evict that one.
+"""
+def handle_pagefault(pageid, state, evict_page, mem_used, mem_size):
+    if len(state['where']) < mem_size:  # If there's free memory, just load
+        return
+    slots, ref = state['slots'], state['ref']
+    hand = state['hand']
+    while True:
+        candidate = slots[hand]
+        hand = (hand + 1) % len(slots)
+        if candidate is None:
+            continue
+        if ref[candidate]:
+            ref[candidate] = False
+            continue
+        break
+    state['hand'] = hand
+    evict_page(candidate)
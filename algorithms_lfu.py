@@ -0,0 +1,84 @@
+from collections import OrderedDict
+
+"""
+Least frequently used page replacement, with ties going to the page that
+reached its count first.
+Set AOS_ALGORITHMS=algorithms_lfu to use it. Everything other than page
+management falls back to algorithm_template.
+"""
+
+### PAGE MANAGEMENT ###
+
+"""
+Pages are grouped into buckets by use count. The buckets that are in use form
+a doubly linked list in increasing count order, so the least frequently used
+page is always at the front of the head bucket, and loading, counting,
+evicting and freeing a page are all O(1).
+    - 'count': pageid -> use count since it was loaded.
+    - 'buckets': count -> OrderedDict of the pageids with that count, oldest first.
+    - 'next', 'prev': count -> neighbouring count in the list of buckets.
+    - 'head': The smallest count in use, or None.
+"""
+def initialize_pagemanager_state():
+    return {'count': {}, 'buckets': {}, 'next': {}, 'prev': {}, 'head': None}
+
+def _link_after(state, count, after):
+    # Add an empty bucket for `count` after the bucket for `after` (None for the front).
+    state['buckets'][count] = OrderedDict()
+    following = state['head'] if after is None else state['next'][after]
+    state['prev'][count] = after
+    state['next'][count] = following
+    if after is None:
+        state['head'] = count
+    else:
+        state['next'][after] = count
+    if following is not None:
+        state['prev'][following] = count
+
+def _unlink_if_empty(state, count):
+    if state['buckets'][count]:
+        return
+    before = state['prev'].pop(count)
+    after = state['next'].pop(count)
+    del state['buckets'][count]
+    if before is None:
+        state['head'] = after
+    else:
+        state['next'][before] = after
+    if after is not None:
+        state['prev'][after] = before
+
+def _bump(state, pageid):
+    # Move a resident page up to the next count.
+    count = state['count'][pageid]
+    if count + 1 not in state['buckets']:
+        _link_after(state, count + 1, count)
+    del state['buckets'][count][pageid]
+    state['buckets'][count + 1][pageid] = None
+    state['count'][pageid] = count + 1
+    _unlink_if_empty(state, count)
+
+def on_page_loaded(pageid, state):
+    if 1 not in state['buckets']:
+        _link_after(state, 1, None)
+    state['buckets'][1][pageid] = None
+    state['count'][pageid] = 1
+
+def on_page_accessed(pageid, state):
+    _bump(state, pageid)
+
+def on_page_freed(pageid, state):
+    count = state['count'].pop(pageid, None)
+    if count is None:
+        return
+    del state['buckets'][count][pageid]
+    _unlink_if_empty(state, count)
+
+"""
+Evict the least frequently used page.
+"""
+def handle_pagefault(pageid, state, evict_page, mem_used, mem_size):
+    if len(state['count']) < mem_size:  # If there's free memory, just load
+        return
+    to_evict = next(iter(state['buckets'][state['head']]))
+    evict_page(to_evict)
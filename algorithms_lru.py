@@ -0,0 +1,40 @@
+from collections import OrderedDict
+
+"""
+Least recently used page replacement.
+Set AOS_ALGORITHMS=algorithms_lru to use it. Everything other than page
+management falls back to algorithm_template.
+"""
+
+### PAGE MANAGEMENT ###
+
+"""
+Resident pages, from least to most recently used.
+"""
+def initialize_pagemanager_state():
+    return OrderedDict()
+
+"""
+A freshly loaded page is the most recently used.
+"""
+def on_page_loaded(pageid, state):
+    state[pageid] = None
+    state.move_to_end(pageid)
+
+"""
+A hit makes the page the most recently used.
+"""
+def on_page_accessed(pageid, state):
+    state.move_to_end(pageid)
+
+def on_page_freed(pageid, state):
+    state.pop(pageid, None)
+
+"""
+Evict the least recently used page.
+"""
+def handle_pagefault(pageid, state, evict_page, mem_used, mem_size):
+    if len(state) < mem_size:  # If there's free memory, just load
+        return
+    to_evict, _ = state.popitem(last=False)
+    evict_page(to_evict)
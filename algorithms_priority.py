@@ -0,0 +1,85 @@
+"""
+Shortest program first scheduling: the ready process with the fewest
+instructions runs, with ties going to the one admitted first. A process keeps
+running until it finishes, unless a shorter one arrives.
+Set AOS_ALGORITHMS=algorithms_priority to use it. Everything other than
+scheduling falls back to algorithm_template.
+"""
+
+### PROCESS SCHEDULING ###
+
+"""
+A binary min-heap of processes that also tracks where each one is, by pid,
+so any process can be removed in O(log n), not just the smallest.
+Entries are [key, process], and keys must be unique.
+"""
+class IndexedHeap:
+    def __init__(self):
+        self.heap = []
+        self.index = {}  # pid -> position in heap
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, process):
+        return process.pid in self.index
+
+    def peek(self):
+        return self.heap[0][1] if self.heap else None
+
+    def push(self, key, process):
+        self.heap.append([key, process])
+        self.index[process.pid] = len(self.heap) - 1
+        self._up(len(self.heap) - 1)
+
+    def remove(self, process):
+        i = self.index.pop(process.pid)
+        last = self.heap.pop()
+        if i == len(self.heap):
+            return
+        self.heap[i] = last
+        self.index[last[1].pid] = i
+        self._down(i)
+        self._up(i)
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.index[heap[i][1].pid] = i
+        self.index[heap[j][1].pid] = j
+
+    def _up(self, i):
+        while i:
+            parent = (i - 1) >> 1
+            if self.heap[parent][0] <= self.heap[i][0]:
+                return
+            self._swap(i, parent)
+            i = parent
+
+    def _down(self, i):
+        size = len(self.heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < size and self.heap[child][0] < self.heap[smallest][0]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+"""
+scheduler.pq holds the ready processes, keyed by (program length, pid).
+"""
+def init_scheduler(scheduler):
+    scheduler.pq = IndexedHeap()
+
+def admit_process(scheduler, process):
+    scheduler.pq.push((len(process.program), process.pid), process)
+
+def pick_process(scheduler):
+    # The process stays in the heap, since it is still ready afterwards.
+    return scheduler.pq.peek()
+
+def terminate_process(scheduler, process):
+    scheduler.pq.remove(process)
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of Process.run instruction throughput, comparing the compiled
+interpreter against the previous one, which dispatched each parsed
+(Operation, arg1, arg2) tuple through a dict of bound methods and kept
+variables in a dict keyed by name.
+
+Run from the repository root:
+    $ pipenv run python benchmarks/bench_interpreter.py [script] [repeats]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory import PhysicalMemory
+from page import PageManager
+from process import Process, Operation
+from processstate import ProcessState
+
+
+class LegacyProcess(Process):
+    # The interpreter as it was before programs were compiled.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.right_data = {}
+        self.ops = {
+            Operation.MALLOC: self._op_malloc,
+            Operation.FREE: self._op_free,
+            Operation.READ: self._op_read,
+            Operation.WRITE: self._op_write,
+            Operation.ACQUIRE: self._op_acquire,
+            Operation.RELEASE: self._op_release,
+        }
+
+    def _op_malloc(self, varname, arg2):
+        new_page = self.pagemngr.make_page(0)
+        self.right_data[varname] = [0, new_page]
+        self.mem_consistency[varname] = True
+        self.pages.append(new_page)
+
+    def _op_write(self, varname, value):
+        info = self.right_data[varname]
+        addr = self.pagemngr.access_page(info[1].uid)
+        info[0] = value
+        self.pagemngr.mem.set(addr, value)
+
+    def _op_read(self, varname, _):
+        info = self.right_data[varname]
+        addr = self.pagemngr.access_page(info[1].uid)
+        if self.pagemngr.mem.get(addr) != info[0]:
+            self.mem_consistency[varname] = False
+
+    def _op_free(self, varname, _):
+        self.pagemngr.free_page(self.right_data[varname][1].uid)
+
+    def run(self, timestep):
+        time_used = 0
+        while self.program_counter < len(self.program):
+            operation, arg1, arg2 = self.program[self.program_counter]
+            if operation == Operation.WORK:
+                self._op_work()
+                if self.unfinished_work + timestep - time_used >= arg1:
+                    time_used += arg1 - self.unfinished_work
+                    self.unfinished_work = 0
+                    self.program_counter += 1
+                    continue
+                else:
+                    self.unfinished_work += timestep - time_used
+                    time_used = timestep
+                    return time_used
+            else:
+                self.ops[operation](arg1, arg2)
+                self.program_counter += 1
+        self.state = ProcessState.EXIT
+        return time_used
+
+
+def bench(cls, script, repeats, timestep=100):
+    # Returns instructions executed per second, running `repeats` processes to completion.
+    pm = PageManager(PhysicalMemory(4096))
+    processes = [cls(pm, script, i, initial_data=[0]) for i in range(repeats)]
+    instructions = 0
+    start = time.perf_counter()
+    for process in processes:
+        while process.state != ProcessState.EXIT:
+            process.run(timestep)
+        instructions += len(process.program)
+        process.free_memory()
+    return instructions / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    script = sys.argv[1] if len(sys.argv) > 1 else 'gcc.process'
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    # Best of three runs each, interleaved so neither side benefits from warm-up
+    legacy, compiled = 0, 0
+    for i in range(3):
+        legacy = max(legacy, bench(LegacyProcess, script, repeats))
+        compiled = max(compiled, bench(Process, script, repeats))
+    print(f'{script}, {repeats} processes')
+    print(f'  legacy:   {legacy:12,.0f} instructions/s')
+    print(f'  compiled: {compiled:12,.0f} instructions/s ({compiled / legacy:.2f}x)')
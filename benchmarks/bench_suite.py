@@ -0,0 +1,219 @@
+"""
+Benchmarks of the simulator's hot paths, saved as JSON so that runs on
+different commits can be compared:
+    - steps: Steps per second of whole scenarios, with history kept.
+    - interpreter: Process.run instructions per second, for each program.
+    - paging: PageManager.access_page calls per second and their fault rate,
+      for each page replacement policy and memory size, on a skewed access
+      pattern where 20% of pages get 80% of accesses.
+    - serialize: Seconds per ScenarioInstance.serialized call, with History's
+      cache cold and warm.
+    - memory: Peak bytes allocated while running 10,000 steps of each scenario.
+      Scenarios where processes pile up make this the slowest part.
+
+Every scenario is run with a fixed seed, so only the timings vary between runs.
+Each timing is the best of `repeats` runs.
+
+Run from the repository root:
+    $ pipenv run python benchmarks/bench_suite.py [-o results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from algorithms import Algorithms
+from bench_interpreter import bench
+from memory import PhysicalMemory
+from page import PageManager
+from process import Process
+from run_sim import Scenario, ScenarioInstance
+
+SCENARIOS = sorted(x[:-len('.toml')] for x in os.listdir('scenarios') if x.endswith('.toml'))
+PROGRAMS = sorted(x for x in os.listdir('programs') if x.endswith('.process'))
+POLICIES = ['algorithm_template', 'algorithms_lru', 'algorithms_clock', 'algorithms_lfu']
+SEED = 1234
+
+# Whether a larger value is better, by the name of the metric
+HIGHER_IS_BETTER = {'steps_per_second': True, 'instructions_per_second': True, 'accesses_per_second': True,
+                    'fault_rate': False, 'cold_seconds': False, 'warm_seconds': False, 'peak_bytes': False}
+
+
+def best_of(repeats, run):
+    # The best (shortest) time of `repeats` calls to run().
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(results, case, run):
+    # Store run()'s metrics as results[case]. Errors are recorded rather than
+    # raised, so one broken scenario or program doesn't stop the suite.
+    try:
+        results[case] = run()
+    except Exception as e:
+        results[case] = {'error': f'{type(e).__name__}: {e}'}
+
+
+def bench_steps(steps, repeats):
+    results = {}
+    for name in SCENARIOS:
+        scenario = Scenario(name)
+        measure(results, name, lambda: {
+            'steps_per_second': steps / best_of(repeats, lambda: ScenarioInstance(scenario, seed=SEED).step(steps))
+        })
+    return results
+
+
+def bench_interpreter(repeats):
+    results = {}
+    for program in PROGRAMS:
+        measure(results, program, lambda: {
+            'instructions_per_second': max(bench(Process, program, 20) for i in range(repeats))
+        })
+    return results
+
+
+def access_pattern(pages, accesses):
+    # 80% of accesses go to the first 20% of pages.
+    rng = random.Random(SEED)
+    hot = max(1, pages // 5)
+    return [rng.randrange(hot) if rng.random() < 0.8 else rng.randrange(hot, pages) for i in range(accesses)]
+
+
+def bench_paging(memories, repeats, pages=256, accesses=50000):
+    pattern = access_pattern(pages, accesses)
+    results = {}
+    for policy in POLICIES:
+        algorithms = Algorithms(policy)
+        for memory in memories:
+            faults = []
+
+            def run():
+                pm = PageManager(PhysicalMemory(memory, algorithms), algorithms)
+                for i in range(pages):
+                    pm.make_page(i)
+                pm.ttl_faults = 0
+                access = pm.access_page
+                for pageid in pattern:
+                    access(pageid)
+                faults.append(pm.ttl_faults)
+
+            measure(results, f'{policy}/{memory}', lambda: {
+                'accesses_per_second': accesses / best_of(repeats, run),
+                'fault_rate': faults[0] / accesses,
+            })
+    return results
+
+
+def bench_serialize(steps, count, repeats):
+    results = {}
+    for name in SCENARIOS:
+        def run():
+            instance = ScenarioInstance(Scenario(name), seed=SEED)
+            instance.step(steps)
+            cache = instance.simulation.history.cache
+
+            def cold():
+                cache.entries.clear()
+                cache.size = 0
+                instance.serialized(count)
+
+            return {'cold_seconds': best_of(repeats, cold),
+                    'warm_seconds': best_of(repeats, lambda: instance.serialized(count))}
+
+        measure(results, name, run)
+    return results
+
+
+def bench_memory(steps):
+    results = {}
+    for name in SCENARIOS:
+        def run():
+            scenario = Scenario(name)
+            tracemalloc.start()
+            try:
+                ScenarioInstance(scenario, seed=SEED).step(steps)
+                return {'peak_bytes': tracemalloc.get_traced_memory()[1]}
+            finally:
+                tracemalloc.stop()
+
+        measure(results, name, run)
+    return results
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(args):
+    return {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': {
+            'steps': bench_steps(args.steps, args.repeats),
+            'interpreter': bench_interpreter(args.repeats),
+            'paging': bench_paging(args.memory, args.repeats),
+            'serialize': bench_serialize(args.steps, 50, args.repeats),
+            'memory': bench_memory(args.memory_steps),
+        },
+    }
+
+
+def compare(baseline, current, threshold):
+    # Print how each metric changed since baseline, flagging those worse by more than threshold.
+    regressions = 0
+    print(f"Compared to {baseline.get('commit') or 'baseline'}:")
+    for group, cases in current['results'].items():
+        for case, metrics in cases.items():
+            for metric, value in metrics.items():
+                old = baseline['results'].get(group, {}).get(case, {}).get(metric)
+                if metric not in HIGHER_IS_BETTER or not old:
+                    continue
+                change = value / old - 1
+                worse = -change if HIGHER_IS_BETTER[metric] else change
+                flag = ''
+                if worse > threshold:
+                    flag = '  REGRESSION'
+                    regressions += 1
+                print(f'  {group}/{case} {metric}: {old:.6g} -> {value:.6g} ({change:+.1%}){flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulator and save the results as JSON.')
+    parser.add_argument('-o', '--output', help='Where to save the results. Defaults to benchmarks/results/<commit>.json.')
+    parser.add_argument('--compare', help='Results to compare against, e.g. from an earlier commit.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='How much worse a metric can get before it is a regression. Defaults to 0.1 (10%%).')
+    parser.add_argument('--steps', type=int, default=2000, help='Steps per scenario run.')
+    parser.add_argument('--memory', type=int, nargs='+', default=[16, 64, 128], help='Memory sizes for paging.')
+    parser.add_argument('--memory-steps', type=int, default=10000, help='Steps per scenario for peak memory.')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    results = run_all(args)
+    output = args.output or os.path.join('benchmarks', 'results', f"{results['commit'] or 'latest'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Saved results to {output}')
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,82 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+"""
+Encoders turn the output of the simulator's serialize() methods (dicts, lists
+and primitives) into the messages sent to clients or written to files.
+
+Each encoder has:
+    - name: What get_encoder() knows it as.
+    - binary: Whether it produces bytes rather than text.
+    - dumps(obj): Encodes a single object.
+    - message(type, history): Builds {'type': type, 'history': [...]} from
+      already encoded states, without decoding them again.
+
+The stdlib 'json' encoder is always available. 'orjson' produces the same
+JSON, only compact and faster, and 'msgpack' produces binary MessagePack.
+They are only available if the corresponding package is installed.
+"""
+class JSONEncoder:
+    name = 'json'
+    binary = False
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def message(self, type, history):
+        # The same as json.dumps() would produce for the whole message.
+        return '{"type": ' + json.dumps(type) + ', "history": [' + ', '.join(history) + ']}'
+
+
+class OrjsonEncoder:
+    name = 'orjson'
+    binary = False
+
+    def dumps(self, obj):
+        # Slots are keyed by int pageids
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def message(self, type, history):
+        return '{"type":' + self.dumps(type) + ',"history":[' + ','.join(history) + ']}'
+
+
+"""
+Maps with int keys, like the page manager's slots, are kept as such, so
+unpacking them needs strict_map_key=False.
+"""
+class MsgpackEncoder:
+    name = 'msgpack'
+    binary = True
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def message(self, type, history):
+        header = b'\x82' + self.dumps('type') + self.dumps(type) + self.dumps('history')
+        return header + msgpack.Packer().pack_array_header(len(history)) + b''.join(history)
+
+
+ENCODERS = {
+    'json': (JSONEncoder, True),
+    'orjson': (OrjsonEncoder, orjson is not None),
+    'msgpack': (MsgpackEncoder, msgpack is not None),
+}
+
+
+def get_encoder(name='json'):
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder '{name}'. Choose from: {', '.join(ENCODERS)}.")
+    cls, available = ENCODERS[name]
+    if not available:
+        raise ValueError(f"The '{name}' encoder needs the {name} package, which isn't installed.")
+    return cls()
@@ -10,6 +10,10 @@ class PageDoesntExist(SimulatorException):
     pass
 
 
+class FrameDoubleFree(SimulatorException):
+    pass
+
+
 class ProgramException(SimulatorException):
     scriptname = None
     varname = None
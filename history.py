@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from copy import deepcopy
+from encoders import JSONEncoder
+import pickle
+import tempfile
+import zlib
+
+
+"""
+A least recently used cache of serialized states, in whichever encoder's
+output (JSON text, msgpack bytes, ...), bounded by their total length. That is
+their size in bytes, for binary encodings and for JSON, since non-ASCII
+characters are escaped.
+"""
+class SerializedCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+"""
+History records every past SimulationState without copying the whole state
+on each step. A full copy (a 'keyframe') is only taken every
+`keyframe_interval` steps; for the steps in between, only the inputs that are
+not derivable from the previous state are journaled (the processes spawned
+before the step ran). Any past state is rebuilt on demand by copying the
+nearest earlier keyframe and replaying the journal forward from it. The
+journal also records how long each step was, since steps may vary in length.
+
+Replaying relies on the simulation being deterministic given its state, so
+algorithm modules must not draw from `random` themselves.
+
+A keyframe and the journal entries that replay from it form a 'segment'.
+The retention policy decides what happens to segments once more than
+`keep_steps` steps are held in memory:
+    - 'keep': Nothing, history grows without bound. The default.
+    - 'spill': Old segments are compressed and appended to an on-disk log,
+      and are read back transparently when indexed.
+    - 'drop': Old segments are discarded. Indexing them raises IndexError,
+      and slices only include the steps that are still available.
+    - 'none': Nothing is recorded at all, only the number of steps, as if
+      every step was dropped straight away. For runs that never look back.
+
+History behaves like a read-only list: it supports len(), iteration, and
+indexing with ints or slices. Every returned state is an independent copy.
+
+Past states never change, so their encoded form is cached by serialized(),
+up to `cache_bytes` in total.
+"""
+class History:
+    RETENTIONS = ('keep', 'spill', 'drop', 'none')
+
+    """
+    :param advance: advance(state, timestep) runs a single simulation step on state.
+    :param begin: begin(state) is called after each step, before re-applying the next one's spawns.
+    :param spawn: spawn(state, record) re-applies a journaled spawn to state.
+    :param keyframe_interval: How many steps to keep between full copies.
+    :param retention: One of 'keep', 'spill', 'drop' or 'none'.
+    :param keep_steps: How many recent steps to hold in memory, at least.
+    :param spill_path: Where to write spilled segments. Defaults to an anonymous temporary file.
+    :param cache_bytes: How much encoded output to cache.
+    """
+    def __init__(self, advance, begin, spawn, *, keyframe_interval=50, retention='keep', keep_steps=None, spill_path=None,
+                 cache_bytes=64 * 1024 * 1024):
+        if keyframe_interval < 1:
+            raise ValueError('keyframe_interval must be at least 1.')
+        if retention not in self.RETENTIONS:
+            raise ValueError(f"Unknown history retention '{retention}'.")
+        if retention in ('spill', 'drop') and keep_steps is None:
+            raise ValueError(f"History retention '{retention}' requires keep_steps.")
+        self.advance = advance
+        self.begin = begin
+        self.spawn = spawn
+        self.keyframe_interval = keyframe_interval
+        self.retention = retention
+        self.keep_steps = keep_steps
+        self.spill_path = spill_path
+        self.spill_file = None
+        self.keyframes = {}  # step index -> SimulationState
+        self.journal = {}  # step index -> (spawns applied before the step, its timestep)
+        self.spilled = {}  # keyframe index -> (offset, size) in spill_file
+        self.start = 0  # Oldest index still available
+        self.resident = 0  # Oldest index still held in memory
+        self.length = 0
+        self.cache = SerializedCache(cache_bytes)
+
+    def append(self, state, spawns, timestep):
+        # Record `state`, which had `spawns` applied to it since the last step
+        # and is about to be advanced by `timestep`.
+        index = self.length
+        if self.retention == 'none':
+            self.length = self.start = self.resident = index + 1
+            return
+        self.journal[index] = (tuple(spawns), timestep)
+        if index % self.keyframe_interval == 0:
+            self.keyframes[index] = deepcopy(state)
+        self.length += 1
+        if self.retention != 'keep':
+            self._retire()
+
+    def _retire(self):
+        # Move whole segments out of memory until only keep_steps (rounded
+        # up to a segment boundary) remain.
+        while self.length - self.resident - self.keyframe_interval >= self.keep_steps:
+            keyframe = self.resident
+            state = self.keyframes.pop(keyframe)
+            end = keyframe + self.keyframe_interval
+            entries = [self.journal.pop(i) for i in range(keyframe, end)]
+            if self.retention == 'spill':
+                self._spill(keyframe, state, entries)
+            else:
+                self.start = end
+            self.resident = end
+
+    def _spill(self, keyframe, state, entries):
+        if self.spill_file is None:
+            if self.spill_path is None:
+                self.spill_file = tempfile.TemporaryFile()
+            else:
+                self.spill_file = open(self.spill_path, 'w+b')
+        blob = zlib.compress(pickle.dumps((state, entries), pickle.HIGHEST_PROTOCOL))
+        self.spill_file.seek(0, 2)
+        self.spilled[keyframe] = (self.spill_file.tell(), len(blob))
+        self.spill_file.write(blob)
+
+    def _segment(self, keyframe):
+        # Returns a fresh copy of a keyframe, and the journal entries of its segment.
+        if keyframe in self.keyframes:
+            end = min(keyframe + self.keyframe_interval, self.length)
+            return deepcopy(self.keyframes[keyframe]), [self.journal[i] for i in range(keyframe, end)]
+        offset, size = self.spilled[keyframe]
+        self.spill_file.seek(offset)
+        return pickle.loads(zlib.decompress(self.spill_file.read(size)))
+
+    def _rebuild(self, indices, after=False):
+        # Rebuild the states at the given ascending indices, reusing
+        # the replay between requested indices where possible. If after
+        # is set, return the states right after those steps ran instead.
+        out = []
+        keyframe = None
+        for index in indices:
+            if keyframe != index - index % self.keyframe_interval or at > index:
+                keyframe = index - index % self.keyframe_interval
+                state, entries = self._segment(keyframe)
+                at = keyframe
+            for i in range(at + 1, index + 1):
+                self.advance(state, entries[i - 1 - keyframe][1])
+                self.begin(state)
+                for spawn in entries[i - keyframe][0]:
+                    self.spawn(state, spawn)
+            at = index
+            copy = deepcopy(state)
+            if after:
+                self.advance(copy, entries[index - keyframe][1])
+            out.append(copy)
+        return out
+
+    def close(self):
+        # Close the spill file, if any. Its owner (normally the Simulation) should call this when done.
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.length
+
+    def _indices(self, key):
+        # The indices an int or slice refers to, in the order given.
+        if isinstance(key, slice):
+            return [i for i in range(*key.indices(len(self))) if i >= self.start]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('history index out of range')
+        if key < self.start:
+            raise IndexError(f'history index {key} was dropped by the retention policy')
+        return [key]
+
+    def _get(self, key, after):
+        indices = self._indices(key)
+        states = dict(zip(sorted(indices), self._rebuild(sorted(indices), after)))
+        if isinstance(key, slice):
+            return [states[i] for i in indices]
+        return states[indices[0]]
+
+    """
+    Like indexing (or after(), if `after` is set), but returns
+    state.<method>(**kwargs) for each state, encoded with `encoder` (JSON by
+    default), as a list for slices. Only the states that aren't cached are
+    rebuilt.
+    """
+    def serialized(self, key, method='serialize', after=False, encoder=None, **kwargs):
+        if encoder is None:
+            encoder = JSONEncoder()
+        indices = self._indices(key)
+        tag = (method, after, encoder.name, tuple(sorted(kwargs.items())))
+        out = {i: self.cache.get((tag, i)) for i in indices}
+        missing = sorted(i for i in indices if out[i] is None)
+        for index, state in zip(missing, self._rebuild(missing, after)):
+            out[index] = encoder.dumps(getattr(state, method)(**kwargs))
+            self.cache.put((tag, index), out[index])
+        if isinstance(key, slice):
+            return [out[i] for i in indices]
+        return out[indices[0]]
+
+    def after(self, key):
+        # Like indexing, but gives the states right after the steps ran
+        # rather than right before. after(-1) is like the current state.
+        return self._get(key, True)
+
+    def __getitem__(self, key):
+        return self._get(key, False)
+
+    def __iter__(self):
+        return iter(self[:])
@@ -9,6 +9,8 @@ import OverviewChart from './OverviewChart';
 import MemoryTimeline from './MemoryTimeline';
 import Timeline from './Timeline';
 import { arrmax, arrsum } from './utilities';
+import { apply_delta } from './delta';
+import { normalize_step } from './columns';
 import { TIMEWINDOW, TIMEBUCKET, ROLLING_WINDOW } from './constants';
 
 // Only returns elements that occured up to time ms ago
@@ -138,7 +140,11 @@ class App extends Component {
     }
     this.rws = new ReconnectingWebSocket(`ws://localhost:8765`);
     this.rws.addEventListener('message', this.handleData);
+    // Ask for new steps as deltas from the previous one, and full steps as columns
+    this.rws.addEventListener('open', () => this.rws.send('{"protocol": "diff", "columnar": true}'));
     this.mem_renders = {};
+    // The latest step in full, which the next delta applies to
+    this.base = null;
   }
 
   updateDimensions = () => {
@@ -179,7 +185,23 @@ class App extends Component {
     if (results.type === 'new') {
       this.setState(oldstate => ({...oldstate, is_on: -1, steps: []}));
     }
-    for (let step of results.history) {
+    if (results.type === 'keyframe') {
+      // The server's current state, which we should already have as the last step
+      this.base = normalize_step(results.history[0]);
+      return;
+    }
+    let history = results.history;
+    if (results.type === 'delta') {
+      if (this.base === null) {
+        this.rws.send('{"resync": true}');
+        return;
+      }
+      history = history.map(delta => (this.base = apply_delta(this.base, delta)));
+    } else {
+      history = history.map(normalize_step);
+      this.base = history[history.length - 1];
+    }
+    for (let step of history) {
       this.setState(oldstate => {
         let state = {...oldstate};
         state.steps = oldstate.steps.slice(0);
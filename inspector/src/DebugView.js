@@ -2,13 +2,18 @@ import React from 'react';
 
 // To aid in debugging Python algorithms
 
+// The freelist is sent as [start, stop) runs of consecutive frames
+function format_freelist(runs) {
+  return runs.map(([start, stop]) => stop - start === 1 ? start : `${start}-${stop - 1}`).join(', ');
+}
+
 export default function Debug(props) {
   if (!props.state) {
     return null;
   }
   return (
     <div width={props.width}>
-      <p style={{width: props.width + 'px'}}>Freelist: {props.state.mem.freelist.join(', ')}</p>
+      <p style={{width: props.width + 'px'}}>Freelist: {format_freelist(props.state.mem.freelist)}</p>
       <p>Total page faults: {props.state.pagemngr.ttl_faults}</p>
     </div>
   )
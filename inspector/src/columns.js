@@ -0,0 +1,32 @@
+// The server can send pages and processes as columns: one list per field.
+
+/**
+ * Turns {field: [values...]} into [{field: value}, ...].
+ */
+export function rows_from_columns(columns) {
+  const fields = Object.keys(columns);
+  const count = fields.length === 0 ? 0 : columns[fields[0]].length;
+  const rows = [];
+  for (let i = 0; i < count; i++) {
+    const row = {};
+    for (const field of fields) {
+      row[field] = columns[field][i];
+    }
+    rows.push(row);
+  }
+  return rows;
+}
+
+/**
+ * Returns a full step with its pages and processes as lists of objects,
+ * whichever way they were sent.
+ */
+export function normalize_step(step) {
+  const pages = step.pagemngr.pages;
+  const processes = step.scheduler.processes;
+  return {
+    ...step,
+    pagemngr: {...step.pagemngr, pages: Array.isArray(pages) ? pages : rows_from_columns(pages)},
+    scheduler: {...step.scheduler, processes: Array.isArray(processes) ? processes : rows_from_columns(processes)}
+  };
+}
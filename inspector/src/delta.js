@@ -0,0 +1,68 @@
+// Rebuilds full steps from the deltas sent by the server in diff mode.
+
+/**
+ * Applies a delta to the full step before it.
+ * @param {object} base - The previous step, in full.
+ * @param {object} delta - What changed since base, from SimulationState.serialize_delta().
+ * @returns A new full step. base is left untouched.
+ */
+export function apply_delta(base, delta) {
+  const memory = base.mem.memory.slice();
+  for (const [addr, data] of delta.mem.memory_diff) {
+    memory[addr] = data;
+  }
+  const mem = {...base.mem, in_use: delta.mem.in_use, memory};
+  if (delta.mem.freelist !== undefined) {
+    mem.freelist = delta.mem.freelist;
+  }
+
+  const pages = base.pagemngr.pages.slice();
+  for (const page of delta.pagemngr.pages) {
+    pages[page.uid] = page;
+  }
+  const slots = {...base.pagemngr.slots};
+  for (const [uid, data] of Object.entries(delta.pagemngr.slots)) {
+    if (data === null) {
+      delete slots[uid];
+    } else {
+      slots[uid] = data;
+    }
+  }
+
+  const removed = new Set(delta.scheduler.exited.map(d => d.pid));
+  const changed = new Map(delta.scheduler.processes.map(d => [d.pid, d]));
+  const processes = [];
+  for (const process of base.scheduler.processes) {
+    if (removed.has(process.pid)) {
+      continue;
+    }
+    processes.push(changed.has(process.pid) ? changed.get(process.pid) : process);
+    changed.delete(process.pid);
+  }
+  // Whatever is left was admitted during the step
+  processes.push(...changed.values());
+  // Resources are only sent when they changed
+  const resources = delta.scheduler.resources !== undefined ? delta.scheduler.resources : base.scheduler.resources;
+
+  return {
+    clock: delta.clock,
+    time: delta.time,
+    pid: delta.pid,
+    mem,
+    pagemngr: {
+      ...base.pagemngr,
+      pages,
+      slots,
+      faults: delta.pagemngr.faults,
+      ttl_faults: delta.pagemngr.ttl_faults
+    },
+    scheduler: {
+      ...base.scheduler,
+      processes,
+      exited: delta.scheduler.exited,
+      term_count: delta.scheduler.term_count,
+      resources,
+      cpus: delta.scheduler.cpus
+    }
+  };
+}
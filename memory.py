@@ -1,29 +1,293 @@
 import algorithms as algo
+from array import array
+import base64
 import exceptions
 import json
+import sys
+
+
+"""
+The freelist handed to the memory algorithms. It acts like a list of free
+frame numbers, except that adding a frame that is already in it raises
+FrameDoubleFree. Used as a stack (append to free, pop() to allocate), as the
+default algorithms do, both are O(1) regardless of the frame count, and
+remove() is too (amortized, for frames on the stack).
+
+Free frames are tracked by a bytearray with one flag per frame, and by a
+stack of frames in the order they were freed. extend() with a contiguous
+range, which is how the default algorithms initialize the freelist, only
+records the range's bounds, so it doesn't take memory proportional to its
+size until frames are popped and pushed back. Removed frames are only
+flagged USED: in the range they leave holes, and on the stack stale entries,
+which pop() skips. The stack is compacted once most of it is stale.
+
+Every other list operation also works (indexing, pop(i), insert(), index(),
+sort(), ...). The first one turns the whole freelist into the stack, so from
+then on it costs what it would on a list.
+"""
+class FreeList:
+    # Flags for each frame
+    USED, FRESH, STACKED = 0, 1, 2
+
+    def __init__(self, framecount):
+        self.framecount = framecount
+        self.free = bytearray(framecount)  # USED, or whether the free frame is in the fresh range or the stack
+        self.fresh = 0  # Frames [0, fresh) that are flagged FRESH are free, and below the stack
+        self.holes = 0  # How many frames in [0, fresh) aren't FRESH
+        self.stack = array('q')
+        self.stale = 0  # How many entries in stack were removed
+        self.changed = False  # Whether it changed since PhysicalMemory.clear_dirty()
+
+    def _check_free(self, addr):
+        if not 0 <= addr < self.framecount:
+            raise exceptions.AddressInvalid(f"Hardware error: can't free frame {addr} (address doesn't exist)")
+        if self.free[addr]:
+            raise exceptions.FrameDoubleFree(f"Frame {addr} was freed twice.")
+
+    def append(self, addr):
+        self._check_free(addr)
+        self.free[addr] = self.STACKED
+        self.stack.append(addr)
+        self.changed = True
+
+    def extend(self, addrs):
+        if isinstance(addrs, range) and addrs.step == 1 and not self.stack and addrs.start == self.fresh \
+                and len(addrs) and addrs.stop <= self.framecount:
+            self.free[addrs.start:addrs.stop] = b'\x01' * len(addrs)
+            self.fresh = addrs.stop
+            self.changed = True
+            return
+        for addr in addrs:
+            self.append(addr)
+
+    def pop(self, index=-1):
+        if index != -1:
+            self._flatten()
+            addr = self.stack.pop(index)
+        elif len(self.stack) > self.stale:
+            addr = self.stack.pop()
+            # Skip removed frames. A frame freed again after being removed is pushed above its stale entries.
+            while self.free[addr] != self.STACKED:
+                self.stale -= 1
+                addr = self.stack.pop()
+        elif self.fresh > self.holes:
+            # The stack only has stale entries, so every frame in the range that isn't FRESH is a hole
+            while self.free[self.fresh - 1] != self.FRESH:
+                self.fresh -= 1
+                self.holes -= 1
+            self.fresh -= 1
+            addr = self.fresh
+        else:
+            raise IndexError('pop from empty freelist')
+        self.free[addr] = self.USED
+        self.changed = True
+        return addr
+
+    def remove(self, addr):
+        if not 0 <= addr < self.framecount or not self.free[addr]:
+            raise ValueError(f'{addr} is not in the freelist')
+        if self.free[addr] == self.FRESH:
+            self.holes += 1
+        else:
+            self.stale += 1
+        self.free[addr] = self.USED
+        self.changed = True
+        if self.stale * 2 > len(self.stack):
+            self._compact()
+
+    def _compact(self):
+        # Drop the stack's stale entries: those of USED frames, and all but the top one of a frame freed again.
+        if self.stale:
+            seen = set()
+            live = []
+            for addr in reversed(self.stack):
+                if self.free[addr] == self.STACKED and addr not in seen:
+                    seen.add(addr)
+                    live.append(addr)
+            live.reverse()
+            self.stack = array('q', live)
+            self.stale = 0
+
+    def _flatten(self):
+        # Move the fresh range onto the bottom of the stack, so that it holds the whole list.
+        self._compact()
+        if self.fresh:
+            fresh = array('q', self._fresh_frames())
+            for addr in fresh:
+                self.free[addr] = self.STACKED
+            self.stack[0:0] = fresh
+            self.fresh = self.holes = 0
+
+    def _fresh_frames(self):
+        if not self.holes:
+            return range(self.fresh)
+        return (x for x in range(self.fresh) if self.free[x] == self.FRESH)
+
+    def insert(self, index, addr):
+        self._check_free(addr)
+        self._flatten()
+        self.free[addr] = self.STACKED
+        self.stack.insert(index, addr)
+        self.changed = True
+
+    def index(self, addr):
+        self._flatten()
+        return self.stack.index(addr)
+
+    def sort(self, *, key=None, reverse=False):
+        self._flatten()
+        self.stack = array('q', sorted(self.stack, key=key, reverse=reverse))
+        self.changed = True
+
+    def reverse(self):
+        self._flatten()
+        self.stack.reverse()
+        self.changed = True
+
+    def __getitem__(self, index):
+        self._flatten()
+        if isinstance(index, slice):
+            return list(self.stack[index])
+        return self.stack[index]
+
+    def __contains__(self, addr):
+        return 0 <= addr < self.framecount and self.free[addr] != self.USED
+
+    def __len__(self):
+        return self.fresh - self.holes + len(self.stack) - self.stale
+
+    def __iter__(self):
+        self._compact()
+        yield from self._fresh_frames()
+        yield from self.stack
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def serialize(self):
+        # The free frames in list order, compressed into [start, stop) runs of consecutive frames.
+        runs = []
+        if self.holes:
+            start = self.free.find(self.FRESH, 0, self.fresh)
+            while start != -1:
+                stop = self.free.find(self.USED, start, self.fresh)
+                stop = self.fresh if stop == -1 else stop
+                # A STACKED frame also ends the run
+                stacked = self.free.find(self.STACKED, start, stop)
+                stop = stop if stacked == -1 else stacked
+                runs.append([start, stop])
+                start = self.free.find(self.FRESH, stop, self.fresh)
+        elif self.fresh:
+            runs.append([0, self.fresh])
+        self._compact()
+        for addr in self.stack:
+            if runs and runs[-1][1] == addr:
+                runs[-1][1] += 1
+            else:
+                runs.append([addr, addr + 1])
+        return runs
+
+
+"""
+The data held in physical memory, one signed 64-bit integer per frame.
+
+Frames are stored in fixed-size blocks of array('q'). Copying a FrameStore
+(as History does for keyframes) only copies the list of blocks: both copies
+share every block, and a block is duplicated the first time either side
+writes to it. So snapshots cost O(framecount / BLOCK) plus whatever actually
+changes afterwards.
+
+It also keeps the set of frames written since clear_dirty() was last called,
+so a step can be serialized as a diff.
+"""
+class FrameStore:
+    SHIFT = 10
+    BLOCK = 1 << SHIFT
+    MASK = BLOCK - 1
+
+    def __init__(self, framecount):
+        self.framecount = framecount
+        count = -(-framecount // self.BLOCK)
+        zeroes = array('q', bytes(8 * self.BLOCK))
+        self.blocks = [zeroes] * count
+        self.owned = bytearray(count)  # 1 if the block isn't shared with a copy
+        self.dirty = set()
+
+    def __getitem__(self, addr):
+        if not 0 <= addr < self.framecount:
+            raise IndexError('frame index out of range')
+        return self.blocks[addr >> self.SHIFT][addr & self.MASK]
+
+    def __setitem__(self, addr, data):
+        if not 0 <= addr < self.framecount:
+            raise IndexError('frame index out of range')
+        index = addr >> self.SHIFT
+        if not self.owned[index]:
+            self.blocks[index] = array('q', self.blocks[index])
+            self.owned[index] = 1
+        self.blocks[index][addr & self.MASK] = data
+        self.dirty.add(addr)
+
+    def __len__(self):
+        return self.framecount
+
+    def __iter__(self):
+        remaining = self.framecount
+        for block in self.blocks:
+            yield from block[:remaining]
+            remaining -= self.BLOCK
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __deepcopy__(self, memo):
+        copy = FrameStore.__new__(FrameStore)
+        copy.framecount = self.framecount
+        copy.blocks = list(self.blocks)
+        copy.dirty = set(self.dirty)
+        # Every block is now shared, so neither side may write to it in place
+        copy.owned = bytearray(len(self.blocks))
+        self.owned = bytearray(len(self.blocks))
+        return copy
+
+    def clear_dirty(self):
+        self.dirty = set()
+
+    def tobytes(self):
+        # All frames as little-endian int64s.
+        data = array('q')
+        for block in self.blocks:
+            data.extend(block)
+        del data[self.framecount:]
+        if sys.byteorder != 'little':
+            data.byteswap()
+        return data.tobytes()
+
 
 """
 Simulates physical memory.
 Our model is segmented, with paging, so the smallest op size is 1 frame.
-Memory is stored as a list, and each element is one frame. Data is represented
+Memory is stored in a FrameStore, and each element is one frame. Data is represented
 as an integer, making it possible to simulate the effects of trampling memory
 due to student error, as well as allowing for more interesting visualization.
 
-PhysicalMemory uses the following methods from algorithms.py:
-    - allocate_page
-    - free_page
+PhysicalMemory uses the following methods from its Algorithms (see algorithms.py):
+    - initialize_freelist
+    - allocate_memory
+    - free_memory
 """
 class PhysicalMemory:
-    def __init__(self, framecount):
+    def __init__(self, framecount, algorithms=None):
         # Creates physical memory with `framecount` frames.
+        algorithms = algo.get_algorithms(algorithms)
 
         self.framecount = framecount
-        self.state = [0 for x in range(framecount)]
+        self.state = FrameStore(framecount)
         self.in_use = 0  # How many frames are currently being used, via counting alloc/free calls
-        self.freelist = []
-        self.initialize_freelist = algo.initialize_freelist(self.freelist, framecount)
-        self.allocate_memory = algo.allocate_memory
-        self.free_memory = algo.free_memory
+        self.freelist = FreeList(framecount)
+        self.initialize_freelist = algorithms.initialize_freelist(self.freelist, framecount)
+        self.allocate_memory = algorithms.allocate_memory
+        self.free_memory = algorithms.free_memory
 
     def get(self, addr):
         # Get the data at addr
@@ -58,12 +322,41 @@ class PhysicalMemory:
         self.free_memory(self.freelist, addr)
         self.in_use -= 1
 
-    def serialize(self):
+    def clear_dirty(self):
+        # Start tracking changes afresh, for serialize_delta().
+        self.state.clear_dirty()
+        self.freelist.changed = False
+
+    """
+    :param memory_format: How to represent the frames' data:
+        - 'list': As 'memory', a list with one int per frame.
+        - 'base64': As 'memory_b64', the base64 of every frame as a little-endian int64.
+        - 'diff': As 'memory_diff', a list of [addr, data] for the frames written since
+          the last call to clear_dirty(), i.e. since the step began.
+    """
+    def serialize(self, memory_format='list'):
         # Return a JSON string that represents this object.
         obj = {}
         obj['objtype'] = 'mem'
         obj['framecount'] = self.framecount
-        obj['memory'] = self.state
+        if memory_format == 'list':
+            obj['memory'] = list(self.state)
+        elif memory_format == 'base64':
+            obj['memory_b64'] = base64.b64encode(self.state.tobytes()).decode('ascii')
+        elif memory_format == 'diff':
+            obj['memory_diff'] = [[addr, self.state[addr]] for addr in sorted(self.state.dirty)]
+        else:
+            raise ValueError(f"Unknown memory format '{memory_format}'.")
+        obj['in_use'] = self.in_use
+        obj['freelist'] = self.freelist.serialize()
+        return obj
+
+    def serialize_delta(self):
+        # Like serialize('diff'), but the freelist is only included if it changed since clear_dirty().
+        obj = {}
+        obj['objtype'] = 'mem'
+        obj['memory_diff'] = [[addr, self.state[addr]] for addr in sorted(self.state.dirty)]
         obj['in_use'] = self.in_use
-        obj['freelist'] = self.freelist
+        if self.freelist.changed:
+            obj['freelist'] = self.freelist.serialize()
         return obj
@@ -16,18 +16,26 @@ class Page:
 class PageManager:
     """
     :param mem: a PhysicalMemory for the PageManager to use.
+    :param algorithms: The Algorithms to use (see algorithms.py). Defaults to the one named by AOS_ALGORITHMS.
     """
-    def __init__(self, mem):
+    def __init__(self, mem, algorithms=None):
+        algorithms = algo.get_algorithms(algorithms)
         self.pages = []
         self.slots = {}  # Where data will be evicted to.
         self.mem = mem
         self.uid_count = 0
-        self.handle_pagefault = algo.handle_pagefault
-        self.on_page_loaded = algo.on_page_loaded
-        self.on_page_freed = algo.on_page_freed
-        self.userstate = algo.initialize_pagemanager_state()
+        self.handle_pagefault = algorithms.handle_pagefault
+        self.on_page_loaded = algorithms.on_page_loaded
+        self.on_page_freed = algorithms.on_page_freed
+        self.on_page_accessed = algorithms.on_page_accessed
+        if self.on_page_accessed is not None:
+            # Only algorithms that want to see hits pay for reporting them
+            self.access_page = self.access_page_tracked
+        self.userstate = algorithms.initialize_pagemanager_state()
         self.faults = 0  # Reset on every step
         self.ttl_faults = 0
+        self.dirty = set()  # uids of pages changed since clear_dirty()
+        self.trace = None  # A TraceWriter to report faults, loads, evictions and frees to (see tracing.py)
 
     def make_page(self, data):
         # Create a new page and return the Page object.
@@ -35,6 +43,7 @@ class PageManager:
         self.uid_count += 1
         # Create the page itself
         self.pages.append(Page(pageid, None))
+        self.dirty.add(pageid)
         # Ensure there is space in memory
         self.handle_pagefault(pageid, self.userstate, self.evict_page, self.mem.in_use, self.mem.framecount)
         # Insert the page into memory
@@ -51,6 +60,9 @@ class PageManager:
             del self.slots[pageid]
         page = self.pages[pageid]
         page.addr = self.mem.alloc(data)
+        self.dirty.add(pageid)
+        if self.trace is not None:
+            self.trace.emit('load', pageid, page.addr)
         # Report page creation to the page manager algorithm
         self.on_page_loaded(pageid, self.userstate)
         return page.addr
@@ -58,9 +70,12 @@ class PageManager:
     def evict_page(self, pageid):
         # Evict a page to the disk, storing its contents in a slot
         page = self.pages[pageid]
+        if self.trace is not None:
+            self.trace.emit('evict', pageid, page.addr)
         self.slots[pageid] = self.mem.get(page.addr)
         self.mem.free(page.addr)
         self.pages[pageid].addr = None
+        self.dirty.add(pageid)
         self.on_page_freed(pageid, self.userstate)
 
     def access_page(self, pageid):
@@ -69,28 +84,79 @@ class PageManager:
         if pageid >= len(self.pages):
             raise exceptions.PageDoesntExist(f"Page {pageid} doesn't exist.")
         if self.pages[pageid].addr is None:
-            self.faults += 1
-            self.ttl_faults += 1
-            self.handle_pagefault(pageid, self.userstate, self.evict_page, self.mem.in_use, self.mem.framecount)
-            self.load_page(pageid)
+            self.fault_page(pageid)
         return self.pages[pageid].addr
 
+    def access_page_tracked(self, pageid):
+        # access_page, but also reports hits to on_page_accessed.
+        if pageid >= len(self.pages):
+            raise exceptions.PageDoesntExist(f"Page {pageid} doesn't exist.")
+        page = self.pages[pageid]
+        if page.addr is None:
+            self.fault_page(pageid)
+        else:
+            self.on_page_accessed(pageid, self.userstate)
+        return page.addr
+
+    def hit_page(self, pageid, count=1):
+        # Report count more accesses of a loaded page, if the algorithms track hits.
+        if self.on_page_accessed is not None:
+            for i in range(count):
+                self.on_page_accessed(pageid, self.userstate)
+
+    def fault_page(self, pageid):
+        # Make room for a page that isn't in memory, then load it.
+        self.faults += 1
+        self.ttl_faults += 1
+        if self.trace is not None:
+            self.trace.emit('fault', pageid)
+        self.handle_pagefault(pageid, self.userstate, self.evict_page, self.mem.in_use, self.mem.framecount)
+        self.load_page(pageid)
+
     def free_page(self, pageid):
         page = self.pages[pageid]
         # don't double free
         if page.freed:
             return
+        if self.trace is not None:
+            self.trace.emit('free', pageid)
         if page.addr is not None:
             self.mem.free(page.addr)
         self.on_page_freed(pageid, self.userstate)
         page.freed = True
+        self.dirty.add(pageid)
 
-    def serialize(self):
+    def clear_dirty(self):
+        self.dirty = set()
+
+    """
+    :param columnar: If set, 'pages' is a dict of parallel lists, one per Page field,
+                     rather than a list of one dict per page (without the constant objtype).
+    """
+    def serialize(self, columnar=False):
         obj = {}
         obj['objtype'] = 'page_manager'
-        obj['pages'] = [x.serialize() for x in self.pages]
+        if columnar:
+            obj['pages'] = {
+                'uid': [x.uid for x in self.pages],
+                'addr': [x.addr for x in self.pages],
+                'freed': [x.freed for x in self.pages],
+            }
+        else:
+            obj['pages'] = [x.serialize() for x in self.pages]
         obj['slots'] = self.slots
         obj['faults'] = self.faults
         obj['ttl_faults'] = self.ttl_faults
         # Do not serialize mem, because it's not 'owned' by PageManager.
         return obj
+
+    def serialize_delta(self):
+        # Only the pages changed since clear_dirty(). Their slots are None if they're not on disk.
+        changed = sorted(self.dirty)
+        obj = {}
+        obj['objtype'] = 'page_manager'
+        obj['pages'] = [self.pages[x].serialize() for x in changed]
+        obj['slots'] = {x: self.slots.get(x) for x in changed}
+        obj['faults'] = self.faults
+        obj['ttl_faults'] = self.ttl_faults
+        return obj
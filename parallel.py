@@ -0,0 +1,140 @@
+from copy import copy
+import exceptions
+
+
+"""
+Evaluating the slices that several CPUs run in the same step on a pool of
+threads, with results identical to running them one after the other.
+
+Processes only interact through the shared PageManager and PhysicalMemory
+(and resources). So each picked process first runs, on a worker, as a copy
+against a FrozenView: page hits and its own memory reads and writes are
+recorded, while anything that would change shared state, like a page fault,
+malloc, free or resource, or that depends on it, like using a freed page whose
+frame another CPU may take, stops the run. The Scheduler then merges the
+slices in CPU order. A slice is committed if it ran to the end of its slice,
+and every page it used is still where it was, since an earlier CPU's page
+faults may have evicted it; otherwise the process runs again for real.
+Committing applies the writes and reports the hits to the page replacement
+algorithm in the order they happened, exactly as running it would have.
+
+Only the workers' runs overlap. With the GIL, that saves no time, but on
+free-threaded CPython wide machines use several cores.
+"""
+
+
+class Conflict(Exception):
+    # Raised when a speculative run needs to change shared state.
+    pass
+
+
+"""
+Stands in for PhysicalMemory: reads see the frozen frames, and the copy's
+own writes, which are kept until committed.
+"""
+class FrozenMemory:
+    def __init__(self, mem):
+        self.mem = mem
+        self.writes = {}  # addr -> data
+
+    def get(self, addr):
+        if addr in self.writes:
+            return self.writes[addr]
+        return self.mem.get(addr)
+
+    def set(self, addr, data):
+        self.writes[addr] = data
+
+
+"""
+Stands in for the PageManager of a speculatively run process.
+"""
+class FrozenView:
+    def __init__(self, pagemngr):
+        self.pages = pagemngr.pages
+        self.mem = FrozenMemory(pagemngr.mem)
+        self.accessed = []  # (pageid, addr) of every access, in order
+
+    def access_page(self, pageid):
+        if pageid >= len(self.pages):
+            raise Conflict()
+        page = self.pages[pageid]
+        if page.addr is None:
+            raise Conflict()  # A page fault
+        if page.freed:
+            # A freed page keeps its addr, but an earlier CPU may reuse the frame in this step
+            raise Conflict()
+        addr = page.addr
+        self.accessed.append((pageid, addr))
+        return addr
+
+    def hit_page(self, pageid, count=1):
+        self.accessed.extend([(pageid, self.pages[pageid].addr)] * count)
+
+    def make_page(self, data):
+        raise Conflict()
+
+    def free_page(self, pageid):
+        raise Conflict()
+
+
+class FrozenResources:
+    def acquire(self, process, name):
+        raise Conflict()
+
+    def release(self, process, name):
+        raise Conflict()
+
+
+# The Process attributes run() can change when it only hits pages
+PRIVATE = ('state', 'program_counter', 'unfinished_work', 'right_data', 'mem_consistency')
+
+
+"""
+A speculative run of one process's slice.
+"""
+class Slice:
+    def __init__(self, process, timestep):
+        self.process = process
+        self.timestep = timestep
+        self.view = FrozenView(process.pagemngr)
+        self.copy = copy(process)
+        self.copy.right_data = [None if x is None else list(x) for x in process.right_data]
+        self.copy.mem_consistency = dict(process.mem_consistency)
+        self.copy.pagemngr = self.view
+        self.copy.resources = FrozenResources()
+        self.time_used = None  # None if it has to run again for real
+
+    def evaluate(self):
+        try:
+            self.time_used = self.copy.run(self.timestep)
+        except (Conflict, exceptions.SimulatorException):
+            # An error in the program will be raised again by running it for real
+            self.time_used = None
+        return self
+
+    def valid(self):
+        pages = self.process.pagemngr.pages
+        return self.time_used is not None and all(pages[x].addr == addr for x, addr in self.view.accessed)
+
+    def commit(self):
+        # Apply the slice to the real process and memory, and return the time it used.
+        pagemngr = self.process.pagemngr
+        for addr, data in self.view.mem.writes.items():
+            pagemngr.mem.set(addr, data)
+        if pagemngr.on_page_accessed is not None:
+            for pageid, addr in self.view.accessed:
+                pagemngr.on_page_accessed(pageid, pagemngr.userstate)
+        for key in PRIVATE:
+            setattr(self.process, key, getattr(self.copy, key))
+        return self.time_used
+
+
+"""
+Run a Slice of each of processes on pool, a concurrent.futures executor.
+:return: The evaluated Slices, in the same order, with None for None processes.
+"""
+def evaluate(pool, processes, timestep):
+    slices = [None if x is None else Slice(x, timestep) for x in processes]
+    list(pool.map(Slice.evaluate, [x for x in slices if x is not None]))
+    return slices
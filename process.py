@@ -1,9 +1,13 @@
+from bisect import bisect_right
 from enum import Enum, auto
 import algorithms as algo
 from copy import deepcopy
 import json
 from processstate import ProcessState
+from resources import ResourceManager
 import exceptions
+import os
+import parallel
 import random
 
 
@@ -17,12 +21,111 @@ class Operation(Enum):
     FREE = 7
 
 
+# Integer opcodes, as used by compiled programs.
+OP_WORK = Operation.WORK.value
+OP_ACQUIRE = Operation.ACQUIRE.value
+OP_MALLOC = Operation.MALLOC.value
+OP_RELEASE = Operation.RELEASE.value
+OP_WRITE = Operation.WRITE.value
+OP_READ = Operation.READ.value
+OP_FREE = Operation.FREE.value
+
+# Operations whose first argument names a variable.
+VARIABLE_OPS = {Operation.MALLOC, Operation.WRITE, Operation.READ, Operation.FREE}
+
+
+"""
+A Program is a script compiled for Process.run. Instructions are stored as
+parallel arrays indexed by program counter: `opcodes` is a bytes of integer
+opcodes, and `arg1`/`arg2` hold their arguments. Variable names are resolved
+at compile time to slots numbered from 0, with `varnames` mapping slots back
+to names.
+
+Runs of consecutive WORK instructions are also precomputed, so that a process
+can consume a whole slice of them at once: `work_end[pc]` is the index just
+past the run containing pc, and `work_prefix[pc]` is the total WORK duration
+of all instructions before pc.
+
+Programs are immutable and shared between every process running the same
+script. Indexing a Program still gives the parsed (Operation, arg1, arg2)
+instruction tuples.
+"""
+class Program:
+    def __init__(self, instructions):
+        self.instructions = tuple(instructions)
+        slots = {}
+        arg1 = []
+        for operation, a1, a2 in self.instructions:
+            if operation in VARIABLE_OPS:
+                a1 = slots.setdefault(a1, len(slots))
+            arg1.append(a1)
+        self.opcodes = bytes(x[0].value for x in self.instructions)
+        self.arg1 = tuple(arg1)
+        self.arg2 = tuple(x[2] for x in self.instructions)
+        self.varnames = tuple(slots)
+        work_end = [0] * len(self.instructions)
+        end = len(self.instructions)
+        for pc in reversed(range(len(self.instructions))):
+            if self.opcodes[pc] != OP_WORK:
+                end = pc
+            work_end[pc] = end
+        self.work_end = tuple(work_end)
+        work_prefix = [0]
+        for op, a1 in zip(self.opcodes, self.arg1):
+            work_prefix.append(work_prefix[-1] + (a1 if op == OP_WORK else 0))
+        self.work_prefix = tuple(work_prefix)
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __getitem__(self, index):
+        return self.instructions[index]
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    def __eq__(self, other):
+        if isinstance(other, Program):
+            return self.instructions == other.instructions
+        return self.instructions == other
+
+    def __hash__(self):
+        return hash(self.instructions)
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+# The program run by processes without a script.
+IDLE_PROGRAM = Program([(Operation.WORK, 1000, '')])
+
+# Compiled programs by path, as (mtime, program).
+_program_cache = {}
+
+
+"""
+Load and compile the program at programs/<scriptname>. Compiled programs are
+cached until the file's mtime changes, so every process running the same
+script shares one Program.
+"""
 # RESOURCES IN ACQUIRE SHOULD BE A PRE CONSTRUCTED ENUM FROM INIT AND SYSTEM DEFINITIONS
 def load_program(scriptname):
     if not scriptname:
-        return [(Operation.WORK, 1000, '')]
+        return IDLE_PROGRAM
+    # Keyed by the absolute path, since programs/ depends on the working directory
+    path = os.path.abspath(os.path.join('programs', scriptname))
+    mtime = os.stat(path).st_mtime_ns
+    cached = _program_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    program = parse_program(path)
+    _program_cache[path] = (mtime, program)
+    return program
+
+
+def parse_program(path):
     program = []
-    with open('programs/' + scriptname) as txt:
+    with open(path) as txt:
         for line in txt:
             if line[0] == '#' or line == '\n': continue
             instruction = line.split()
@@ -34,15 +137,22 @@ def load_program(scriptname):
             # Ensure instruction is at least len 3
             instruction += [''] * (3 - len(instruction))
             program.append(tuple(instruction))
-    return program
+    return Program(program)
 
 
 class Process:
-    def __init__(self, pagemngr, scriptname, pid, *, initial_pages=1, name=None, spawned_at=None):
+    """
+    :param initial_data: The data of each initial page. Drawn from rng if not given.
+    :param rng: A random.Random, or the random module by default.
+    """
+    def __init__(self, pagemngr, scriptname, pid, *, initial_pages=1, name=None, spawned_at=None, initial_data=None,
+                 rng=random):
         self.pages = []
         self.pagemngr = pagemngr
-        for i in range(initial_pages):
-            self.pages.append(pagemngr.make_page(random.randint(0, 1000)))
+        if initial_data is None:
+            initial_data = [rng.randint(0, 1000) for i in range(initial_pages)]
+        for data in initial_data:
+            self.pages.append(pagemngr.make_page(data))
         self.state = ProcessState.NEW
         self.pid = pid
         self.name = str(pid) if name is None else name
@@ -52,73 +162,74 @@ class Process:
 
         self.unfinished_work = 0
         self.scriptname = scriptname
+        self.resources = None  # The ResourceManager, once admitted
+        self.cpu = None  # The CPU whose run queue it is on, once admitted
         self.program = load_program(scriptname)
         self.program_counter = 0
-        # ('a', 10, pageref),
-        # Stores what data *should* be in a page. Helps with visualizing logic errors.
-        self.right_data = {}
+        # Stores what data *should* be in each variable slot, as [data, page].
+        # Helps with visualizing logic errors.
+        self.right_data = [None] * len(self.program.varnames)
         self.mem_consistency = {}
-        self.ops = {
-            Operation.MALLOC: self._op_malloc,
-            Operation.FREE: self._op_free,
-            Operation.READ: self._op_read,
-            Operation.WRITE: self._op_write,
-            Operation.ACQUIRE: self._op_acquire,
-            Operation.RELEASE: self._op_release,
-            Operation.WORK: self._op_work,
-        }
-
-    def read_var(self, varname):
-        info = self.right_data[varname]
+
+    def read_var(self, slot):
+        info = self.right_data[slot]
         addr = self.pagemngr.access_page(info[1].uid)
         val = self.pagemngr.mem.get(addr)
         if val != info[0]:
-            self.mem_consistency[varname] = False
+            self.mem_consistency[self.program.varnames[slot]] = False
         return val
 
-    def write_var(self, varname, value):
-        info = self.right_data[varname]
+    def write_var(self, slot, value):
+        info = self.right_data[slot]
         addr = self.pagemngr.access_page(info[1].uid)
         info[0] = value
         self.pagemngr.mem.set(addr, value)
 
-    def _op_malloc(self, varname, arg2):
+    def _op_malloc(self, slot, arg2):
         new_page = self.pagemngr.make_page(0)
         # [0] is the correct data, [1] is a ref to the page obj
-        self.right_data[varname] = [0, new_page]
-        self.mem_consistency[varname] = True
+        self.right_data[slot] = [0, new_page]
+        self.mem_consistency[self.program.varnames[slot]] = True
         self.pages.append(new_page)
 
-    def _op_write(self, varname, value):
-        if varname in self.right_data:
-            self.write_var(varname, value)
+    def _op_write(self, slot, value):
+        if self.right_data[slot] is not None:
+            self.write_var(slot, value)
         else:
-            raise exceptions.ProgramWriteBeforeMalloc(script=self.scriptname, varname=varname, line=self.program_counter + 1)
+            raise exceptions.ProgramWriteBeforeMalloc(script=self.scriptname, varname=self.program.varnames[slot], line=self.program_counter + 1)
 
-    def _op_read(self, varname, _):
-        if varname not in self.right_data:
-            raise exceptions.ProgramReadBeforeMalloc(script=self.scriptname, varname=varname, line=self.program_counter + 1)
-        self.read_var(varname)
+    def _op_read(self, slot, _):
+        if self.right_data[slot] is None:
+            raise exceptions.ProgramReadBeforeMalloc(script=self.scriptname, varname=self.program.varnames[slot], line=self.program_counter + 1)
+        self.read_var(slot)
 
-    def _op_free(self, varname, _):
-        if varname not in self.right_data:
-            raise exceptions.ProgramFreeBeforeMalloc(script=self.scriptname, varname=varname, line=self.program_counter + 1)
-        page = self.right_data[varname][1]
+    def _op_free(self, slot, _):
+        if self.right_data[slot] is None:
+            raise exceptions.ProgramFreeBeforeMalloc(script=self.scriptname, varname=self.program.varnames[slot], line=self.program_counter + 1)
+        page = self.right_data[slot][1]
         self.pagemngr.free_page(page.uid)
 
-    # TODO: Implement resource system
-    def _op_acquire(self, arg1, arg2):
-        pass
+    def _op_acquire(self, name, _):
+        # Returns True if the process has to block until it gets the resource.
+        if self.resources is None:
+            # Running outside a Scheduler, so nothing can contend for it
+            self.resources = ResourceManager()
+        return not self.resources.acquire(self, name)
 
-    def _op_release(self, arg1, arg2):
-        if arg1 in self.resources.keys():
-            # release resource
-            self.resources.pop(arg1)
+    def _op_release(self, name, _):
+        if self.resources is not None:
+            self.resources.release(self, name)
 
     def _op_work(self):
         # make sure to access the 'program data'
         self.pagemngr.access_page(self.pages[0].uid)
 
+    def _repeat_work(self, count):
+        # The other WORK instructions reached in a run access the 'program data' too,
+        # and it is still loaded, so they're hits.
+        if count:
+            self.pagemngr.hit_page(self.pages[0].uid, count)
+
     def free_memory(self):
         for page in self.pages:
             self.pagemngr.free_page(page.uid)
@@ -126,39 +237,64 @@ class Process:
 
     """
     The scheduler will call run() with the time slice. This is the maximum
-    cpu time that the process can use. run() must return the amount of its
-    slice that has been left unused, e.g. because it is blocked.
+    cpu time that the process can use. run() returns how much of the slice it
+    used, which is less than all of it if it finished or blocked.
     """
     def run(self, timestep):
         time_used = 0  # Time used in this slice
-        while self.program_counter < len(self.program):
-            operation, arg1, arg2 = self.program[self.program_counter]
-
-            if operation == Operation.WORK:
+        program = self.program
+        opcodes, arg1, arg2 = program.opcodes, program.arg1, program.arg2
+        work_end, work_prefix = program.work_end, program.work_prefix
+        end = len(opcodes)
+        pc = self.program_counter
+        while pc < end:
+            op = opcodes[pc]
+            if op == OP_WORK:
+                # Runs of WORK are handled in one go. Only the first can fault on
+                # the 'program data', since nothing can evict it after; the rest
+                # are reported as hits.
                 self._op_work()
-                # For work, arg1 is work duration
-                # Case: Done with this step of work
-                if self.unfinished_work + timestep - time_used >= arg1:
-                    # Since it is finished, set time and go to next line
-                    time_used += arg1 - self.unfinished_work
+                run_end = work_end[pc]
+                # How far into the run this slice can get, counting work already done
+                target = work_prefix[pc] + self.unfinished_work + timestep - time_used
+                # Case: Done with the whole run of work
+                if target >= work_prefix[run_end]:
+                    time_used += work_prefix[run_end] - work_prefix[pc] - self.unfinished_work
                     self.unfinished_work = 0  # Reset memoed work
-                    self.program_counter += 1
+                    self._repeat_work(run_end - pc - 1)
+                    pc = run_end
                     continue
-                # Case: Not done with this step of work
-                else:
-                    # Add the right amount of work to memo
-                    self.unfinished_work += timestep - time_used
-                    time_used = timestep
-                    return time_used
-                # todo: fix work interactions
-            else:
-                self.ops[operation](arg1, arg2)
-                self.program_counter += 1
+                # Case: The slice ends within the run. Skip the instructions
+                # that finish and memo the work done on the one that doesn't.
+                start, pc = pc, bisect_right(work_prefix, target, pc, run_end) - 1
+                self._repeat_work(pc - start)
+                self.unfinished_work = target - work_prefix[pc]
+                self.program_counter = pc
+                return timestep
+            # Ops may raise, and report program_counter as the failing line
+            self.program_counter = pc
+            if _OPS[op](self, arg1[pc], arg2[pc]):
+                # Blocked on a resource. It is acquired by the time the process wakes.
+                self.program_counter = pc + 1
+                self.state = ProcessState.BLOCKED
+                return time_used
+            pc += 1
 
         # Program terminates here.
+        self.program_counter = pc
         self.state = ProcessState.EXIT
         return time_used
 
+    def __deepcopy__(self, memo):
+        # Terminated processes never change again, so copies can share them.
+        if self.state == ProcessState.DONE:
+            return self
+        copy = Process.__new__(Process)
+        memo[id(self)] = copy
+        for key, value in self.__dict__.items():
+            setattr(copy, key, deepcopy(value, memo))
+        return copy
+
     def serialize(self):
         # Return a JSON string that represents this object.
         obj = {}
@@ -171,52 +307,267 @@ class Process:
         obj['ended'] = self.ended
         obj['program_counter'] = self.program_counter
         obj['program_length'] = len(self.program)
+        obj['cpu'] = self.cpu
         # obj['program'] = self.program
         obj['mem_consistency'] = self.mem_consistency
         return obj
 
 
+# Non-WORK operations, indexed by opcode.
+_OPS = [None] * (max(x.value for x in Operation) + 1)
+_OPS[OP_ACQUIRE] = Process._op_acquire
+_OPS[OP_MALLOC] = Process._op_malloc
+_OPS[OP_RELEASE] = Process._op_release
+_OPS[OP_WRITE] = Process._op_write
+_OPS[OP_READ] = Process._op_read
+_OPS[OP_FREE] = Process._op_free
+
+
+"""
+The run queue of a single CPU: the processes on it that can be picked to run,
+and the one it ran last. Scheduling algorithms are given a CPU's RunQueue as
+their `scheduler`, and keep their own state on it.
+"""
+class RunQueue:
+    def __init__(self, cpu):
+        self.cpu = cpu
+        self.ready = {}  # pid -> processes on this CPU that are READY, or RUNNING
+        self.running = None  # The process that ran last
+
+
+"""
+The Scheduler keeps live processes by pid, and separately the 'ready set':
+the processes that can be picked to run, also by pid. Both are dicts, so
+adding and removing processes is O(1) and iteration is in admission order.
+
+Each CPU has its own RunQueue, with its own ready set and algorithm state.
+Admitted processes go to the CPU with the fewest ready processes, and stay
+there. Every slice, each CPU picks one of its queue's processes with
+pick_process, which must return one of queue.ready, or None if it is empty.
+The picked processes then run one after the other, in CPU order.
+With work stealing, a CPU with nothing to run takes a waiting process from
+the CPU with the most, moving it with terminate_process and admit_process.
+
+Processes that block on a resource (see resources.py) leave the ready set
+until the process releasing it wakes them, so they cost nothing meanwhile.
+"""
 class Scheduler:
-    def __init__(self):
-        self.processes = []
+    """
+    :param algorithms: The Algorithms to use (see algorithms.py). Defaults to the one named by AOS_ALGORITHMS.
+    :param cpus: How many processes can run in each slice.
+    :param work_stealing: Whether CPUs with nothing to run take processes from the others.
+    """
+    def __init__(self, algorithms=None, cpus=1, work_stealing=False):
+        algorithms = algo.get_algorithms(algorithms)
+        if cpus < 1:
+            raise ValueError('There must be at least one CPU.')
+        self.live = {}  # pid -> every process that hasn't terminated
+        self.ready = {}  # pid -> processes that are READY, or RUNNING, on any CPU
+        self.queues = [RunQueue(cpu) for cpu in range(cpus)]
+        self.work_stealing = work_stealing
+        self.occupancy = [[None, 0] for cpu in range(cpus)]  # [pid, time used] by each CPU in the last run()
         self.term_procs = []
-        self.admit_process = algo.admit_process
-        self.pick_process = algo.pick_process
-        self.terminate_process = algo.terminate_process
-        algo.init_scheduler(self)
+        self.admit_process = algorithms.admit_process
+        self.pick_process = algorithms.pick_process
+        self.terminate_process = algorithms.terminate_process
+        # Blocking and waking are like leaving and rejoining the ready processes, unless algorithms care
+        self.block_process = algorithms.block_process or algorithms.terminate_process
+        self.wake_process = algorithms.wake_process or algorithms.admit_process
+        self.resources = ResourceManager()
+        self.changed = {}  # pid -> live processes changed since clear_dirty()
+        self.exited = []  # Processes terminated during the last run()
+        self.trace = None  # A TraceWriter to report scheduling decisions to (see tracing.py)
+        self.committed = 0  # Slices evaluated on a pool and committed
+        self.rerun = 0  # Slices evaluated on a pool that had to run again for real
+        for queue in self.queues:
+            algorithms.init_scheduler(queue)
+
+    @property
+    def processes(self):
+        # Live processes, in the order they were admitted.
+        return list(self.live.values())
 
     def admit(self, process):
-        self.admit_process(self, process)
+        queue = min(self.queues, key=lambda x: len(x.ready))
+        process.cpu = queue.cpu
+        self.admit_process(queue, process)
         process.state = ProcessState.READY
-        self.processes.append(process)
+        process.resources = self.resources
+        self.live[process.pid] = process
+        self.ready[process.pid] = process
+        queue.ready[process.pid] = process
+        self.changed[process.pid] = process
+        if self.trace is not None:
+            self.trace.emit('spawn', process.pid, queue.cpu, process.name, process.scriptname)
+
+    def wake(self, process):
+        # Make a blocked process ready again, on the CPU it was on.
+        queue = self.queues[process.cpu]
+        self.wake_process(queue, process)
+        process.state = ProcessState.READY
+        self.ready[process.pid] = process
+        queue.ready[process.pid] = process
+        self.changed[process.pid] = process
+        if self.trace is not None:
+            self.trace.emit('wake', process.pid)
+
+    def waiting(self, queue, picking):
+        # How many of queue's processes won't run this slice, while CPU `picking` picks.
+        # CPUs before it have picked already; the others will each run one of theirs.
+        if queue.cpu < picking:
+            return len(queue.ready) - (queue.running is not None)
+        return max(len(queue.ready) - 1, 0)
+
+    def steal(self, queue):
+        # Move a waiting process from the CPU with the most onto queue's, and pick it.
+        # Returns None if no CPU has a process waiting.
+        victim = max(self.queues, key=lambda x: self.waiting(x, queue.cpu))
+        if not self.waiting(victim, queue.cpu):
+            return None
+        # The one that joined it last, skipping the one it picked this slice
+        for process in reversed(victim.ready.values()):
+            if process is not victim.running:
+                break
+        if self.trace is not None:
+            self.trace.emit('steal', process.pid, victim.cpu, queue.cpu)
+        self.terminate_process(victim, process)
+        del victim.ready[process.pid]
+        process.cpu = queue.cpu
+        self.admit_process(queue, process)
+        queue.ready[process.pid] = process
+        self.changed[process.pid] = process
+        return self.pick_process(queue)
+
+    def is_idle(self):
+        # True if no process could be picked to run.
+        return not self.ready
 
     """
-    Run programs for a given timestep. Scheduler is in charge of updating process
-    runtimes.
+    Run programs for a given timestep, one on each CPU. Scheduler is in charge
+    of updating process runtimes.
     :param timestep: The duration to simulate.
     :param time: The system time, intended for timestamp use.
+    :param pool: A concurrent.futures executor to evaluate the CPUs' slices on (see
+                 parallel.py), or None to run them one after the other. Either way,
+                 the results are the same.
+    :return: [pid, time used], where pid is the process run by the first CPU that
+             ran one, or None if none did, and the time is the longest any CPU ran
+             for. What each CPU ran is in self.occupancy.
     """
-    def run(self, timestep, time):
-        for process in self.processes:
-            if process.state == ProcessState.RUNNING:
-                process.state = ProcessState.READY
+    def run(self, timestep, time, pool=None):
+        self.exited = []
+        for queue in self.queues:
+            if queue.running is not None:
+                if queue.running.state == ProcessState.RUNNING:
+                    queue.running.state = ProcessState.READY
+                    self.changed[queue.running.pid] = queue.running
+                queue.running = None
+        picked = []
+        for queue in self.queues:
+            process = self.pick_process(queue)
+            if process is None and self.work_stealing:
+                process = self.steal(queue)
+            if process is not None:
+                process.state = ProcessState.RUNNING
+                queue.running = process
+                self.changed[process.pid] = process
+            picked.append(process)
+
+        slices = [None] * len(picked)
+        if pool is not None and len(picked) - picked.count(None) > 1:
+            slices = parallel.evaluate(pool, picked, timestep)
+        self.occupancy = []
+        for queue, process, piece in zip(self.queues, picked, slices):
+            if process is None:
+                self.occupancy.append([None, 0])
+                continue
+            # Merged in CPU order, so earlier CPUs may have invalidated the slice
+            if piece is not None and piece.valid():
+                timeused = piece.commit()
+                self.committed += 1
+            else:
+                if piece is not None:
+                    self.rerun += 1
+                timeused = process.run(timestep)
+            self.occupancy.append([process.pid, timeused])
+            if self.trace is not None:
+                self.trace.emit('run', queue.cpu, process.pid, timeused)
+            self.finish(queue, process, time + timeused)
+        # Whoever got the resources released can run again
+        for woken in self.resources.take_woken():
+            self.wake(woken)
 
-        process = self.pick_process(self)
-        if process is None:
+        busy = [x for x in self.occupancy if x[0] is not None]
+        if not busy:
             return [None, timestep]  # Report that no process ran for slice
-        process.state = ProcessState.RUNNING
-        timeused = process.run(timestep)
-        # do handling for finished process or i/o waiting
-        if process.state == ProcessState.EXIT:
-            self.terminate_process(self, process)
+        return [busy[0][0], max(x[1] for x in busy)]
+
+    def finish(self, queue, process, time):
+        # do handling for finished process or i/o waiting, on queue's CPU
+        if process.state == ProcessState.BLOCKED:
+            if self.trace is not None:
+                self.trace.emit('block', process.pid, queue.cpu)
+            self.block_process(queue, process)
+            del self.ready[process.pid]
+            del queue.ready[process.pid]
+            queue.running = None
+        elif process.state == ProcessState.EXIT:
+            if self.trace is not None:
+                self.trace.emit('exit', process.pid, queue.cpu)
+            self.terminate_process(queue, process)
             process.state = ProcessState.DONE
-            process.ended = time + timeused
+            process.ended = time
             process.free_memory()
+            self.resources.release_all(process)
+            # It won't touch memory or resources again, and shouldn't keep them alive in copies
+            process.pagemngr = None
+            process.resources = None
             self.term_procs.append(process)
-            self.processes.remove(process)
-        return [process.pid, timeused]
+            del self.live[process.pid]
+            del self.ready[process.pid]
+            del queue.ready[process.pid]
+            queue.running = None
+            self.changed.pop(process.pid, None)
+            self.exited.append(process)
 
-    def serialize(self):
-        obj = {'processes': [x.serialize() for x in self.processes]}
-        obj['term_procs'] = [x.serialize() for x in self.term_procs]
+    def clear_dirty(self):
+        self.changed = {}
+        self.resources.clear_dirty()
+
+    """
+    Terminated processes are only serialized once, in 'exited' for the step they
+    terminated in. 'term_count' is how many there are in total; they can be
+    fetched on demand with serialize_terminated().
+    :param columnar: If set, 'processes' is a dict of parallel lists, one per
+                     serialized field, rather than a list of one dict per process.
+    """
+    def serialize(self, columnar=False):
+        processes = [x.serialize() for x in self.live.values()]
+        if columnar:
+            fields = processes[0].keys() if processes else []
+            processes = {key: [x[key] for x in processes] for key in fields}
+        obj = {'processes': processes}
+        obj['exited'] = [x.serialize() for x in self.exited]
+        obj['term_count'] = len(self.term_procs)
+        obj['resources'] = self.resources.serialize()
+        obj['cpus'] = self.serialize_cpus()
+        return obj
+
+    def serialize_delta(self):
+        # Live processes changed since clear_dirty(), and the ones that terminated since.
+        # Resources are only included if they changed; what each CPU ran always is.
+        obj = {'processes': [self.changed[x].serialize() for x in sorted(self.changed)]}
+        obj['exited'] = [x.serialize() for x in self.exited]
+        obj['term_count'] = len(self.term_procs)
+        if self.resources.changed:
+            obj['resources'] = self.resources.serialize()
+        obj['cpus'] = self.serialize_cpus()
         return obj
+
+    def serialize_cpus(self):
+        # The pid each CPU ran in the last slice, or None if it was idle, and for how long.
+        return [{'pid': pid, 'time': time} for pid, time in self.occupancy]
+
+    def serialize_terminated(self, start=0):
+        # Terminated processes, in the order they terminated, from index start on.
+        return [x.serialize() for x in self.term_procs[start:]]
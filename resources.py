@@ -0,0 +1,80 @@
+from collections import deque
+
+
+"""
+Named resources that processes ACQUIRE and RELEASE, each held by at most one
+process at a time. Acquiring a resource that another process holds queues
+the process on that resource's wait queue; the Scheduler then blocks it, so
+it isn't considered for running at all until it is woken.
+
+Releasing a resource hands it straight to the first process waiting on it,
+which is added to `woken` for the Scheduler to make ready again. Waiters are
+served first come, first served. Every operation is O(1), apart from
+release_all(), which is proportional to what the process holds.
+"""
+class ResourceManager:
+    def __init__(self):
+        self.holders = {}  # name -> the process holding it
+        self.waiting = {}  # name -> deque of processes waiting for it, oldest first
+        self.held = {}  # pid -> names of the resources it holds, in the order it got them
+        self.woken = []  # Processes given a resource since take_woken() was last called
+        self.changed = False  # Whether anything changed since clear_dirty()
+
+    def acquire(self, process, name):
+        # Returns whether process now holds the resource. If not, it is waiting for it.
+        holder = self.holders.get(name)
+        if holder is process:
+            return True
+        self.changed = True
+        if holder is None:
+            self._give(process, name)
+            return True
+        if name not in self.waiting:
+            self.waiting[name] = deque()
+        self.waiting[name].append(process)
+        return False
+
+    def release(self, process, name):
+        # Releasing a resource the process doesn't hold does nothing.
+        if self.holders.get(name) is not process:
+            return
+        names = self.held[process.pid]
+        names.remove(name)
+        if not names:
+            del self.held[process.pid]
+        self._hand_off(name)
+
+    def release_all(self, process):
+        # Release everything process holds, e.g. because it terminated.
+        for name in self.held.pop(process.pid, []):
+            self._hand_off(name)
+
+    def _give(self, process, name):
+        self.holders[name] = process
+        if process.pid not in self.held:
+            self.held[process.pid] = []
+        self.held[process.pid].append(name)
+
+    def _hand_off(self, name):
+        self.changed = True
+        queue = self.waiting.get(name)
+        if not queue:
+            del self.holders[name]
+            return
+        process = queue.popleft()
+        if not queue:
+            del self.waiting[name]
+        self._give(process, name)
+        self.woken.append(process)
+
+    def take_woken(self):
+        woken, self.woken = self.woken, []
+        return woken
+
+    def clear_dirty(self):
+        self.changed = False
+
+    def serialize(self):
+        # name -> the pid holding it and the pids waiting for it, for every resource in use.
+        return {name: {'holder': self.holders[name].pid, 'waiting': [x.pid for x in self.waiting.get(name, ())]}
+                for name in sorted(self.holders)}
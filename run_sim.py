@@ -1,10 +1,15 @@
-from collections import defaultdict
+import argparse
 from copy import deepcopy
+from encoders import get_encoder
+import heapq
 import json
+import os
 from simulator import Simulation
 import sys
 import random
+import time
 import toml
+from tracing import open_trace
 
 class Run:
     def __init__(self, name=None, script=None, offset=0):
@@ -13,7 +18,8 @@ class Run:
         self.offset = offset
         self.count = 0
 
-    def next(self):
+    # rng is the random.Random to draw from, if the run is random.
+    def next(self, rng=random):
         return None
 
 class RunOnce(Run):
@@ -28,7 +34,7 @@ class RunEvery(Run):
         self.limit = limit
         super().__init__(**kwargs)
 
-    def next(self):
+    def next(self, rng=random):
         if self.limit is None or self.count < self.limit:
             t = self.offset + self.interval * self.count
             self.count += 1
@@ -50,13 +56,38 @@ class RunRand(Run):
         self.ticksum = self.offset  # Make it possible to track when the next time is
 
     # Increment the count and return what the next index should be. None if no more.
-    def next(self):
+    def next(self, rng=random):
         if self.limit is None or self.count < self.limit:
-            self.ticksum += random.randint(self.minimum, self.maximum)
+            self.ticksum += rng.randint(self.minimum, self.maximum)
             self.count += 1
             return self.ticksum
         return None
 
+"""
+A SpawnQueue holds upcoming spawns in a heap ordered by spawn time. Spawns due
+at the same time come out in the order they were pushed.
+"""
+class SpawnQueue:
+    def __init__(self):
+        self.heap = []
+        self.count = 0  # Tie-breaker that keeps same-time spawns stable
+
+    def push(self, t, run):
+        heapq.heappush(self.heap, (t, self.count, run))
+        self.count += 1
+
+    def pop_due(self, t):
+        # Pop the next run due at or before t, or None if there isn't one.
+        if self.heap and self.heap[0][0] <= t:
+            return heapq.heappop(self.heap)[2]
+        return None
+
+    def next_time(self):
+        return self.heap[0][0]
+
+    def __len__(self):
+        return len(self.heap)
+
 """
 A Scenario loads a simulator scenario from a file. It is immutable.
 """
@@ -66,6 +97,9 @@ class Scenario:
             data = toml.load(f)
         self.name = name
         self.memory = data['system']['memory']
+        self.seed = data['system'].get('seed')  # None if the scenario isn't seeded
+        self.cpus = data['system'].get('cpus', 1)
+        self.work_stealing = data['system'].get('work_stealing', False)
         self.run_once, self.run_every, self.run_rand = [], [], []
         if 'run_once' in data:
             self.run_once = [RunOnce(**x) for x in data['run_once']]
@@ -76,71 +110,309 @@ class Scenario:
 
 """
 A ScenarioInstance has state. Using a Scenario, it builds a Simulation that will run with the given parameters.
+Extra keyword arguments configure the Simulation's history, e.g. retention='spill', keep_steps=1000.
+Every random draw, for RunRand and the data of spawned processes, comes from the instance's
+own random.Random, seeded with seed or else the scenario's seed, so that instances with the
+same seed produce identical runs. Without either, the seed is drawn from the random module.
+If memory, cpus or work_stealing are given, they override the scenario's settings. If workers
+is set, the CPUs' slices are evaluated on that many threads, with the same results. If trace is
+given, the events of every step are written to that TraceWriter (see tracing.py). algorithms picks
+the Algorithms (a bundle, module or module name) to simulate with, and defaults to the one named by
+AOS_ALGORITHMS.
+
+If event_driven is set, stretches where no process is ready are skipped in a single step
+that lasts until the next spawn. The gap is rounded up to whole slices, so processes spawn
+at the same clock, and run identically, as with fixed slices.
+
+Output is encoded with the named encoder (see encoders.py). If columnar is set, full
+states list their pages and processes as parallel lists rather than one dict each.
 """
 class ScenarioInstance:
-    def __init__(self, scenario):
+    def __init__(self, scenario, *, event_driven=False, encoder='json', columnar=False, memory=None, algorithms=None,
+                 seed=None, cpus=None, work_stealing=None, workers=None, trace=None, **history):
         self.scenario = deepcopy(scenario)
+        if seed is None:
+            seed = scenario.seed if scenario.seed is not None else random.getrandbits(64)
+        self.seed = seed
+        self.random = random.Random(seed)
 
         # Insert all run_once. For every/rand, insert the next copy and insert a new one when popping it.
-        insertbuffer = defaultdict(list)
+        insertbuffer = SpawnQueue()
         for run in self.scenario.run_once:
-            insertbuffer[run.offset].append(run)
+            insertbuffer.push(run.offset, run)
         for run in self.scenario.run_every:
-            t = run.next()
+            t = run.next(self.random)
             if t is not None:
-                insertbuffer[t].append(run)
+                insertbuffer.push(t, run)
         for run in self.scenario.run_rand:
-            t = run.next()
+            t = run.next(self.random)
             if t is not None:
-                insertbuffer[t].append(run)
+                insertbuffer.push(t, run)
 
         self.insertbuffer = insertbuffer
-        self.simulation = Simulation(memorysize=scenario.memory)
+        self.event_driven = event_driven
+        self.encoder = get_encoder(encoder)
+        self.columnar = columnar
+        self.simulation = Simulation(memorysize=scenario.memory if memory is None else memory, algorithms=algorithms,
+                                     cpus=scenario.cpus if cpus is None else cpus,
+                                     work_stealing=scenario.work_stealing if work_stealing is None else work_stealing,
+                                     workers=workers, trace=trace,
+                                     rng=self.random, **history)
 
+    """
+    The last `count` states, in full. Past states are served from History's
+    cache of encoded states when possible.
+    """
     def serialized(self, count=1, isUpdate=True):
         history = []
         if count > 1:
-            history = [x.serialize() for x in self.simulation.history[-count + 1:]]
-        history.append(self.simulation.current.serialize())
-        obj = {'type': 'update' if isUpdate else 'new', 'history': history}
-        return json.dumps(obj)
+            history = self.simulation.history.serialized(slice(-count + 1, None), encoder=self.encoder,
+                                                         columnar=self.columnar)
+        history.append(self.encoder.dumps(self.simulation.current.serialize(columnar=self.columnar)))
+        return self.encoder.message('update' if isUpdate else 'new', history)
+
+    def close(self):
+        # Release the simulation's thread pool and History's spill file.
+        self.simulation.close()
+
+    """
+    Processes that have terminated, in the order they terminated, from index start on.
+    """
+    def serialized_terminated(self, start=0):
+        processes = self.simulation.current.sched.serialize_terminated(start)
+        obj = {'type': 'terminated', 'start': start, 'processes': processes}
+        return self.encoder.dumps(obj)
+
+    """
+    The current state in full, for a client using deltas to (re)synchronize from.
+    """
+    def serialized_keyframe(self):
+        obj = {'type': 'keyframe', 'history': [self.simulation.current.serialize(columnar=self.columnar)]}
+        return self.encoder.dumps(obj)
+
+    """
+    The states after each of the last `count` steps, each serialized as a delta
+    from the one before it. The first is relative to the state the simulation
+    was in `count` steps ago. If those steps are no longer in history, sends
+    a keyframe instead.
+    """
+    def serialized_delta(self, count=1):
+        history = self.simulation.history
+        if len(history) - count < history.start:
+            return self.serialized_keyframe()
+        deltas = history.serialized(slice(len(history) - count, len(history) - 1), 'serialize_delta', after=True,
+                                    encoder=self.encoder)
+        deltas.append(self.encoder.dumps(self.simulation.current.serialize_delta()))
+        return self.encoder.message('delta', deltas)
 
     def step(self, steps):
         for i in range(steps):
             t = self.simulation.current.clock
-            # Find new processes, if needed, and insert
-            to_pop = []
-            for key in sorted(self.insertbuffer.keys()):
-                # 'catch up' on missed process spawns
-                if key > t:
-                    break
-                processes = self.insertbuffer[key]
-                to_pop.append(key)
-                for process in processes:
-                    # Spawn process
-                    self.simulation.spawn_process(process)
-                    # If need to add more, queue up.
-                    next_t = process.next()
-                    if next_t is not None:
-                        self.insertbuffer[next_t].append(process)
-            for key in to_pop:
-                del self.insertbuffer[key]
+            # Find new processes, if needed, and insert.
+            # This 'catches up' on every spawn due by now, including repeats
+            # of a run whose interval is shorter than a slice.
+            process = self.insertbuffer.pop_due(t)
+            while process is not None:
+                self.simulation.spawn_process(process)
+                # If need to add more, queue up.
+                next_t = process.next(self.random)
+                if next_t is not None:
+                    self.insertbuffer.push(next_t, process)
+                process = self.insertbuffer.pop_due(t)
             # Advance simulation
-            self.simulation.step()
+            self.simulation.step(self.next_timestep())
+
+    def next_timestep(self):
+        # How long the next step should be. None means a regular slice.
+        sim = self.simulation
+        if not self.event_driven or not self.insertbuffer or not sim.current.sched.is_idle():
+            return None
+        gap = self.insertbuffer.next_time() - sim.current.clock
+        slices = max(1, -(-gap // sim.slice_length))
+        return slices * sim.slice_length
+
+
+"""
+Metrics accumulates summary statistics over the steps of a simulation, so
+they don't have to be derived from its history afterwards.
+"""
+class Metrics:
+    def __init__(self):
+        self.steps = 0
+        self.busy = 0  # CPU time spent running processes, summed over CPUs
+        self.idle = 0  # CPU time where a CPU had no process to run
+
+    def record(self, state):
+        # Record the step that just ran on state.
+        self.steps += 1
+        occupancy = state.sched.occupancy
+        busy = sum(time for pid, time in occupancy if pid is not None)
+        self.busy += busy
+        self.idle += state.time * len(occupancy) - busy
+
+    def summary(self, state):
+        obj = {}
+        obj['steps'] = self.steps
+        obj['clock'] = state.clock
+        obj['busy'] = self.busy
+        obj['idle'] = self.idle
+        obj['cpus'] = len(state.sched.queues)
+        obj['utilization'] = self.busy / (state.clock * obj['cpus']) if state.clock else 0.0
+        obj['faults'] = state.pagemngr.ttl_faults
+        obj['spawned'] = state.pidcount
+        obj['terminated'] = len(state.sched.term_procs)
+        obj['running'] = len(state.sched.live)
+        obj['mem_in_use'] = state.mem.in_use
+        return obj
+
+
+"""
+Run a ScenarioInstance for `steps` steps, or until its clock reaches
+`until_clock`, as fast as possible. Returns the summary metrics of the run,
+and closes the instance's Simulation once it is done.
+For long runs, the instance should be created with retention='none' so that
+no history is kept.
+:param trace: If given, a file each step is written to as it runs, encoded with
+              the instance's encoder: one JSON document per line for text
+              encoders, or back to back for binary ones.
+:param deltas: Write the initial state in full, then each step as a delta from the last.
+               By default, the state after each step is written in full.
+"""
+def run_headless(instance, *, steps=None, until_clock=None, trace=None, deltas=False):
+    if (steps is None) == (until_clock is None):
+        raise ValueError('Exactly one of steps and until_clock must be given.')
+    encoder = instance.encoder
+    separator = b'' if encoder.binary else '\n'
+
+    def write(obj):
+        trace.write(encoder.dumps(obj) + separator)
+
+    metrics = Metrics()
+    sim = instance.simulation
+    if trace is not None and deltas:
+        write(sim.current.serialize(columnar=instance.columnar))
+    start = time.perf_counter()
+    try:
+        while (metrics.steps < steps) if steps is not None else (sim.current.clock < until_clock):
+            instance.step(1)
+            metrics.record(sim.current)
+            if trace is not None:
+                write(sim.current.serialize_delta() if deltas else sim.current.serialize(columnar=instance.columnar))
+    finally:
+        sim.close()
+    elapsed = time.perf_counter() - start
+    summary = metrics.summary(sim.current)
+    summary['wall_time'] = elapsed
+    summary['steps_per_second'] = metrics.steps / elapsed if elapsed else None
+    return summary
+
+
+def headless(args):
+    # Run headless as configured by the command line arguments.
+    encoder = 'msgpack' if args.format == 'binary' else os.environ.get('AOS_ENCODER', 'json')
+    events = None
+    try:
+        if args.events is not None:
+            events = open_trace(args.events)
+        instance = ScenarioInstance(Scenario(args.scenario), event_driven=args.event_driven, encoder=encoder,
+                                    columnar=args.columnar, algorithms=args.algorithms, seed=args.seed, cpus=args.cpus,
+                                    work_stealing=args.work_stealing, workers=args.workers, trace=events,
+                                    retention='none')
+    except (ValueError, ImportError, OSError) as e:
+        if events is not None:
+            events.close()
+        sys.exit(f'error: {e}')
+    if args.format == 'jsonl' and instance.encoder.binary:
+        sys.exit(f"error: The '{encoder}' encoder can't write JSON lines.")
+    to_stdout = args.output in (None, '-')
+    trace = None
+    if args.format != 'summary':
+        if to_stdout:
+            trace = sys.stdout.buffer if instance.encoder.binary else sys.stdout
+        else:
+            trace = open(args.output, 'wb' if instance.encoder.binary else 'w')
+    try:
+        summary = run_headless(instance, steps=args.steps, until_clock=args.until_clock, trace=trace,
+                               deltas=args.deltas)
+    finally:
+        if trace is not None and not to_stdout:
+            trace.close()
+        if events is not None:
+            events.close()
+    if args.format == 'summary' and not to_stdout:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    else:
+        # Keep stdout for the trace if that's where it went
+        print(json.dumps(summary, indent=2), file=sys.stderr if trace is not None and to_stdout else sys.stdout)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run a scenario, serving it to the inspector over a websocket, '
+                                                 'or headless if --steps or --until-clock is given.')
+    parser.add_argument('scenario', help='Name of a scenario in scenarios/, without .toml.')
+    parser.add_argument('--algorithms', help='Algorithm module to use, instead of AOS_ALGORITHMS.')
+    limit = parser.add_mutually_exclusive_group()
+    limit.add_argument('--steps', type=int, help='Run this many steps headless.')
+    limit.add_argument('--until-clock', type=int, help='Run headless until the clock reaches this.')
+    parser.add_argument('--format', choices=['summary', 'jsonl', 'binary'], default='summary',
+                        help='Write only summary metrics (the default), or a trace of every step as JSON lines '
+                             'or msgpack.')
+    parser.add_argument('-o', '--output', help="Where to write the trace or summary. Defaults to stdout ('-').")
+    parser.add_argument('--deltas', action='store_true', help='Trace steps as deltas after the initial state.')
+    parser.add_argument('--columnar', action='store_true', help='Trace full states in columnar form.')
+    parser.add_argument('--event-driven', action='store_true', help='Skip idle stretches in a single step.')
+    parser.add_argument('--seed', type=int, help="Seed the simulation, instead of the scenario's seed.")
+    parser.add_argument('--cpus', type=int, help="How many CPUs to simulate, instead of the scenario's count.")
+    parser.add_argument('--work-stealing', dest='work_stealing', action='store_true', default=None,
+                        help="Have idle CPUs take waiting processes from the others, whatever the scenario says.")
+    parser.add_argument('--no-work-stealing', dest='work_stealing', action='store_false', default=None,
+                        help="Don't steal, whatever the scenario says.")
+    parser.add_argument('--workers', type=int, help="Evaluate the CPUs' slices on this many threads.")
+    parser.add_argument('--events', help='Also record page, process and scheduling events to this file, as gzipped '
+                                         'JSON lines if it ends in .gz, or else compact binary (see tracing.py).')
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
+    args = parse_args()
+    if args.steps is not None or args.until_clock is not None:
+        headless(args)
+        sys.exit()
+
     import websockets
     import asyncio
 
+    """
+    Clients request steps with {"steps": n}. By default each reply carries the
+    new steps in full. A client can instead send {"protocol": "diff"} to have
+    them sent as deltas, or {"resync": true} to get a keyframe of the current
+    state; both are answered with a keyframe. Adding "columnar": true to either
+    switches full states to columnar pages and processes. Terminated processes are only sent
+    in the step they exit in; {"terminated": start} fetches them from index start on.
+    """
     async def listen(websocket, path):
-        sim = ScenarioInstance(Scenario(sys.argv[1]))
-        await websocket.send(sim.serialized(isUpdate=False))
-        async for message in websocket:
-            data = json.loads(message)
-            steps = data['steps']
-            sim.step(steps)
-            await websocket.send(sim.serialized(steps))
+        # AOS_ENCODER picks the encoder, like AOS_ALGORITHMS picks the algorithms
+        sim = ScenarioInstance(Scenario(args.scenario), encoder=os.environ.get('AOS_ENCODER', 'json'),
+                               algorithms=args.algorithms)
+        try:
+            await websocket.send(sim.serialized(isUpdate=False))
+            diffs = False
+            async for message in websocket:
+                data = json.loads(message)
+                if 'protocol' in data or 'resync' in data:
+                    diffs = diffs or data.get('protocol') == 'diff'
+                    sim.columnar = data.get('columnar', sim.columnar)
+                    await websocket.send(sim.serialized_keyframe())
+                    continue
+                if 'terminated' in data:
+                    await websocket.send(sim.serialized_terminated(data['terminated']))
+                    continue
+                steps = data['steps']
+                sim.step(steps)
+                await websocket.send(sim.serialized_delta(steps) if diffs else sim.serialized(steps))
+        finally:
+            sim.close()
 
     asyncio.get_event_loop().run_until_complete(
         websockets.serve(listen, '0.0.0.0', 8765))
@@ -1,5 +1,8 @@
-from copy import deepcopy
+from algorithms import get_algorithms
+from concurrent.futures import ThreadPoolExecutor
 import json
+import random
+from history import History
 from memory import PhysicalMemory
 from page import PageManager
 from process import Scheduler, Process
@@ -12,44 +15,153 @@ a sim step's changes into a new SimState, then never edit it.
 """
 # Need to store simulation state for supporting rewinding
 class SimulationState:
-    def __init__(self, *, memorysize=10):
+    """
+    :param algorithms: The Algorithms bundle, module or module name to simulate with (see algorithms.py).
+    :param cpus: How many CPUs the Scheduler runs processes on.
+    :param work_stealing: Whether idle CPUs take processes from busy ones.
+    """
+    def __init__(self, *, memorysize=10, algorithms=None, cpus=1, work_stealing=False):
+        algorithms = get_algorithms(algorithms)
         self.time = 0  # This state's wall duration
         self.clock = 0  # The current wall clock
-        self.mem = PhysicalMemory(memorysize)
-        self.pagemngr = PageManager(self.mem)
-        self.sched = Scheduler()
+        self.mem = PhysicalMemory(memorysize, algorithms)
+        self.pagemngr = PageManager(self.mem, algorithms)
+        self.sched = Scheduler(algorithms, cpus=cpus, work_stealing=work_stealing)
         self.pidcount = 0
+        # The pid the first busy CPU ran in the last step, or None if every CPU was idle.
+        # With several CPUs, sched.occupancy (serialized as the scheduler's 'cpus') has them all.
         self.pid = None
 
-    def serialize(self):
+    """
+    :param memory_format: See PhysicalMemory.serialize.
+    :param columnar: Whether to serialize pages and processes as parallel lists.
+    """
+    def serialize(self, memory_format='list', columnar=False):
         obj = {}
         obj['clock'] = self.clock
         obj['time'] = self.time
         obj['pid'] = self.pid
-        obj['mem'] = self.mem.serialize()
-        obj['pagemngr'] = self.pagemngr.serialize()
-        obj['scheduler'] = self.sched.serialize()
+        obj['mem'] = self.mem.serialize(memory_format)
+        obj['pagemngr'] = self.pagemngr.serialize(columnar)
+        obj['scheduler'] = self.sched.serialize(columnar)
         return obj
 
+    def clear_dirty(self):
+        self.mem.clear_dirty()
+        self.pagemngr.clear_dirty()
+        self.sched.clear_dirty()
+
+    """
+    Serialize only what changed since clear_dirty() was called, which
+    Simulation does just before each step's spawns. So the delta of the
+    state after a step is relative to the state after the previous step.
+    """
+    def serialize_delta(self):
+        obj = {}
+        obj['clock'] = self.clock
+        obj['time'] = self.time
+        obj['pid'] = self.pid
+        obj['mem'] = self.mem.serialize_delta()
+        obj['pagemngr'] = self.pagemngr.serialize_delta()
+        obj['scheduler'] = self.sched.serialize_delta()
+        return obj
+
+
+"""
+A Spawn records everything needed to re-create a spawned process when
+History replays a step, including the random initial page data.
+"""
+class Spawn:
+    def __init__(self, script, name, data):
+        self.script = script
+        self.name = name
+        self.data = data
+
 
 class Simulation:
-    def __init__(self, *, memorysize=10):
-        self.history = []
-        self.current = SimulationState(memorysize=memorysize)
+    """
+    :param memorysize: How many frames of physical memory to simulate.
+    :param algorithms: The Algorithms bundle, module or module name to simulate with (see algorithms.py).
+                       Defaults to the one named by AOS_ALGORITHMS.
+    :param cpus: How many processes can run in each step, one per CPU.
+    :param work_stealing: Whether CPUs with nothing to run take processes from the others.
+    :param workers: If set, the CPUs' slices are evaluated on a pool of this many threads,
+                    with the same results as without (see parallel.py).
+    :param trace: A TraceWriter to record the events of every step to, as they happen (see tracing.py).
+    :param rng: The random.Random that spawned processes' data is drawn from, or the random module by default.
+    :param history: Keyword arguments for the History, e.g. its retention policy.
+    """
+    def __init__(self, *, memorysize=10, algorithms=None, cpus=1, work_stealing=False, workers=None, trace=None,
+                 rng=random, **history):
+        self.current = SimulationState(memorysize=memorysize, algorithms=algorithms, cpus=cpus,
+                                       work_stealing=work_stealing)
+        self.rng = rng
+        self.trace = trace
+        self.pool = ThreadPoolExecutor(workers) if workers else None
+        self.history = History(self.advance, self.begin, self.apply_spawn, **history)
         self.slice_length = 100
+        self.spawns = []  # Spawns applied to current since the last step
+        self.begun = False  # Whether begin() was called on current since the last step
+
+    @property
+    def trace(self):
+        return self._trace
+
+    @trace.setter
+    def trace(self, trace):
+        # current's PageManager and Scheduler report their events to it directly
+        self._trace = trace
+        self.current.pagemngr.trace = trace
+        self.current.sched.trace = trace
 
-    def step(self):
-        self.history.append(self.current)
-        self.current = deepcopy(self.current)
-        self.current.pagemngr.faults = 0  # Reset fault count
-        pid, timeused = self.current.sched.run(self.slice_length, self.current.clock)
-        self.current.pid = pid
+    """
+    Advance the simulation by one step, of `timestep` or one slice by default.
+    A longer timestep is only meaningful while no process is ready to run,
+    in which case the whole idle gap is recorded as a single step.
+    """
+    def step(self, timestep=None):
+        if timestep is None:
+            timestep = self.slice_length
+        if not self.begun:
+            self.begin(self.current)
+        # current is stepped in place; History only copies it on keyframes.
+        self.history.append(self.current, self.spawns, timestep)
+        self.spawns = []
+        self.begun = False
+        self.advance(self.current, timestep)
+        if self.trace is not None:
+            state = self.current
+            self.trace.emit('step', len(self.history) - 1, state.clock, state.time, state.pid)
+
+    def close(self):
+        # Shut down the thread pool and close History's spill file, when done with the simulation.
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.history.close()
+
+    def begin(self, state):
+        # Start tracking the changes made by the next step, including its spawns.
+        state.clear_dirty()
+
+    def advance(self, state, timestep):
+        state.pagemngr.faults = 0  # Reset fault count
+        pid, timeused = state.sched.run(timestep, state.clock, self.pool)
+        state.pid = pid
         # This should be streamlined later
-        self.current.time = timeused
-        self.current.clock += timeused
+        state.time = timeused
+        state.clock += timeused
 
     def spawn_process(self, proc_spec):
-        state = self.current
-        p = Process(state.pagemngr, proc_spec.script, state.pidcount, name=proc_spec.name, spawned_at=state.time)
+        if not self.begun:
+            self.begin(self.current)
+            self.begun = True
+        spawn = Spawn(proc_spec.script, proc_spec.name, [self.rng.randint(0, 1000)])
+        self.apply_spawn(self.current, spawn)
+        self.spawns.append(spawn)
+
+    def apply_spawn(self, state, spawn):
+        p = Process(state.pagemngr, spawn.script, state.pidcount, name=spawn.name, spawned_at=state.clock,
+                    initial_data=spawn.data)
         state.sched.admit(p)
         state.pidcount += 1
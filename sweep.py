@@ -0,0 +1,96 @@
+import argparse
+from algorithms import Algorithms
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
+import json
+from run_sim import Scenario, ScenarioInstance, run_headless
+import sys
+
+"""
+Runs every combination of scenario, algorithm module, memory size and seed
+headless, and collects their summary metrics into one table. The cells are
+spread over a pool of worker processes.
+"""
+
+FIELDS = ['scenario', 'algorithm', 'memory', 'seed']
+
+
+def run_cell(cell, steps=None, until_clock=None, event_driven=False):
+    # Run one cell of the grid, in a worker, and return its row of the table.
+    row = dict(zip(FIELDS, cell))
+    scenario, algorithm, memory, seed = cell
+    instance = None
+    try:
+        instance = ScenarioInstance(Scenario(scenario), event_driven=event_driven, memory=memory,
+                                    algorithms=algorithm, seed=seed, retention='none')
+        row.update(run_headless(instance, steps=steps, until_clock=until_clock))
+        if memory is None:
+            row['memory'] = instance.simulation.current.mem.framecount
+        row['error'] = None
+    except Exception as e:
+        # A policy that crashes the simulation is a result too
+        row['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        if instance is not None:
+            instance.simulation.close()
+    return row
+
+
+"""
+Run the whole grid and return one row per cell, in grid order. If a cell's
+simulation raises, its row has the exception in 'error' instead of metrics.
+:param memories: Memory sizes to try. None uses each scenario's own.
+:param jobs: How many worker processes to run at a time. Defaults to the CPU count.
+:param run: Keyword arguments for each run: steps or until_clock, and optionally event_driven.
+"""
+def sweep(scenarios, algorithms, memories=(None,), seeds=(0,), *, jobs=None, **run):
+    for algorithm in algorithms:
+        Algorithms(algorithm)  # Fail early on a bad module name
+    cells = list(itertools.product(scenarios, algorithms, memories, seeds))
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(run_cell, cell, **run) for cell in cells]
+        return [x.result() for x in futures]
+
+
+def write_table(rows, f, table_format):
+    if table_format == 'json':
+        json.dump(rows, f, indent=2)
+        f.write('\n')
+        return
+    columns = []
+    for row in rows:
+        columns += [x for x in row if x not in columns]
+    writer = csv.DictWriter(f, columns)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run a grid of headless simulations in parallel.')
+    parser.add_argument('--scenarios', nargs='+', required=True, help='Scenario names, without .toml.')
+    parser.add_argument('--algorithms', nargs='+', default=['algorithm_template'], help='Algorithm module names.')
+    parser.add_argument('--memory', nargs='+', type=int, default=[None],
+                        help="Memory sizes. Defaults to each scenario's own.")
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    limit = parser.add_mutually_exclusive_group(required=True)
+    limit.add_argument('--steps', type=int, help='Run each cell for this many steps.')
+    limit.add_argument('--until-clock', type=int, help='Run each cell until the clock reaches this.')
+    parser.add_argument('--event-driven', action='store_true', help='Skip idle stretches in a single step.')
+    parser.add_argument('-j', '--jobs', type=int, help='Worker processes. Defaults to the CPU count.')
+    parser.add_argument('-o', '--output', help='Where to write the table. Defaults to stdout.')
+    parser.add_argument('--format', choices=['csv', 'json'],
+                        help='Table format. Defaults to json for .json outputs, and csv otherwise.')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    rows = sweep(args.scenarios, args.algorithms, args.memory, args.seeds, jobs=args.jobs, steps=args.steps,
+                 until_clock=args.until_clock, event_driven=args.event_driven)
+    table_format = args.format or ('json' if args.output and args.output.endswith('.json') else 'csv')
+    if args.output is None:
+        write_table(rows, sys.stdout, table_format)
+    else:
+        with open(args.output, 'w', newline='') as f:
+            write_table(rows, f, table_format)
@@ -0,0 +1,16 @@
+import pytest
+
+
+class Spec:
+    # Stands in for run_sim's process specs in Simulation.spawn_process()
+    def __init__(self, name, script=''):
+        self.name = name
+        self.script = script
+
+
+@pytest.fixture
+def program_dir(tmp_path, monkeypatch):
+    # An empty programs/ to write scripts to, in a temporary working directory
+    (tmp_path / 'programs').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / 'programs'
@@ -0,0 +1,114 @@
+from algorithms import Algorithms
+import algorithm_template
+import algorithms_lru
+from memory import PhysicalMemory
+from page import PageManager
+from process import Process
+from processstate import ProcessState
+import pytest
+from simulator import Simulation
+
+
+def make_pagemanager(module, framecount):
+    algorithms = Algorithms(module)
+    return PageManager(PhysicalMemory(framecount, algorithms), algorithms)
+
+
+def resident(pm):
+    return {page.uid for page in pm.pages if page.addr is not None and not page.freed}
+
+
+@pytest.mark.parametrize('module', ['algorithm_template', 'algorithms_lru', 'algorithms_clock', 'algorithms_lfu'])
+def test_policies_stay_within_memory(module):
+    pm = make_pagemanager(module, 3)
+    for i in range(6):
+        pm.make_page(i)
+    pm.free_page(4)
+    for uid in [0, 1, 2, 3, 5, 0, 2]:
+        pm.access_page(uid)
+        assert len(resident(pm)) <= 3
+        assert uid in resident(pm)
+    assert pm.mem.in_use == len(resident(pm))
+
+
+def test_fifo_evicts_oldest_load():
+    pm = make_pagemanager('algorithm_template', 2)
+    for i in range(3):
+        pm.make_page(i)
+    assert resident(pm) == {1, 2}
+    pm.free_page(1)
+    pm.make_page(3)
+    assert resident(pm) == {2, 3}
+
+
+def test_clock_gives_second_chance():
+    pm = make_pagemanager('algorithms_clock', 2)
+    pm.make_page(0)
+    pm.make_page(1)
+    # Both pages are referenced, so the hand clears both bits and evicts page 0
+    pm.make_page(2)
+    assert resident(pm) == {1, 2}
+    # Page 1's bit is now clear, while page 2 was just referenced
+    pm.make_page(3)
+    assert resident(pm) == {2, 3}
+
+
+def test_lfu_free_keeps_buckets_linked():
+    pm = make_pagemanager('algorithms_lfu', 2)
+    pm.make_page(0)
+    pm.make_page(1)
+    pm.free_page(0)
+    pm.free_page(1)
+    assert pm.userstate['head'] is None
+    pm.make_page(2)
+    assert pm.userstate['buckets'] == {1: {2: None}}
+
+
+def test_pagemanager_skips_hits_without_hook():
+    pm = PageManager(PhysicalMemory(1))
+    assert pm.on_page_accessed is None
+    assert 'access_page' not in vars(pm)
+
+
+def test_lru_sees_hits():
+    pm = make_pagemanager('algorithms_lru', 2)
+    pm.make_page(0)
+    pm.make_page(1)
+    pm.access_page(0)
+    pm.make_page(2)
+    assert resident(pm) == {0, 2}
+
+
+def test_every_work_instruction_is_a_hit(program_dir):
+    (program_dir / 'work.process').write_text('work 10\nwork 10\nwork 10\n')
+    algorithms = Algorithms('algorithms_lfu')
+    pm = PageManager(PhysicalMemory(4, algorithms), algorithms)
+    process = Process(pm, 'work.process', 0)
+    # Each slice reaches two of the instructions, like stepping through them one by one
+    process.run(15)
+    process.run(15)
+    assert process.state == ProcessState.EXIT
+    assert pm.userstate['count'][process.pages[0].uid] == 1 + 4
+
+
+def test_lfu_evicts_least_used():
+    pm = make_pagemanager('algorithms_lfu', 3)
+    for i in range(3):
+        pm.make_page(i)
+    for uid in [0, 0, 2, 1, 2, 0]:
+        pm.access_page(uid)
+    # Counts are now 0: 4, 1: 2, 2: 3
+    pm.make_page(3)
+    assert resident(pm) == {0, 2, 3}
+    pm.make_page(4)
+    assert resident(pm) == {0, 2, 4}
+
+
+def test_simulations_use_their_own_algorithms():
+    lru = Simulation(memorysize=4, algorithms='algorithms_lru')
+    fifo = Simulation(memorysize=4)
+    assert lru.current.pagemngr.handle_pagefault is algorithms_lru.handle_pagefault
+    assert fifo.current.pagemngr.handle_pagefault is algorithm_template.handle_pagefault
+    # Anything the module leaves out falls back to the template
+    assert lru.current.sched.pick_process is algorithm_template.pick_process
+    assert Algorithms('algorithms_lru').on_page_accessed is algorithms_lru.on_page_accessed
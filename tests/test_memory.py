@@ -1,4 +1,7 @@
-from memory import PhysicalMemory
+from memory import PhysicalMemory, FreeList, FrameStore
+from copy import deepcopy
+import base64
+import struct
 import exceptions
 import pytest
 
@@ -35,3 +38,114 @@ def test_simple_free():
     mem.alloc(1)
     mem.free(0)
     assert mem.freelist == []
+
+
+def test_freelist_pops_like_a_list():
+    freelist = FreeList(5)
+    freelist.extend(range(5))
+    assert list(freelist) == [0, 1, 2, 3, 4]
+    assert freelist.pop() == 4
+    assert freelist.pop() == 3
+    freelist.append(4)
+    assert list(freelist) == [0, 1, 2, 4]
+    assert freelist.pop() == 4
+    assert freelist.pop() == 2
+    assert len(freelist) == 2
+
+
+def test_freelist_detects_double_free():
+    freelist = FreeList(3)
+    freelist.extend(range(3))
+    addr = freelist.pop()
+    freelist.append(addr)
+    with pytest.raises(exceptions.FrameDoubleFree):
+        freelist.append(addr)
+    with pytest.raises(exceptions.FrameDoubleFree):
+        freelist.append(0)
+
+
+def test_freelist_serializes_runs():
+    freelist = FreeList(1000000)
+    freelist.extend(range(1000000))
+    assert freelist.serialize() == [[0, 1000000]]
+    freelist.pop()
+    a, b = freelist.pop(), freelist.pop()
+    freelist.append(b)
+    freelist.append(a)
+    freelist.remove(10)
+    freelist.append(10)
+    assert freelist.serialize() == [[0, 10], [11, 999999], [10, 11]]
+
+
+def test_freelist_removes_from_the_fresh_range():
+    freelist = FreeList(1000000)
+    freelist.extend(range(1000000))
+    freelist.remove(999999)
+    freelist.remove(500000)
+    assert len(freelist.stack) == 0 and len(freelist) == 999998
+    assert freelist.serialize() == [[0, 500000], [500001, 999999]]
+    assert freelist.pop() == 999998
+    freelist.remove(999997)
+    assert freelist.pop() == 999996
+
+
+def test_freelist_removes_from_the_stack():
+    freelist = FreeList(8)
+    for addr in (3, 5, 1, 6):
+        freelist.append(addr)
+    freelist.remove(1)
+    freelist.remove(6)
+    # Only flagged, and skipped when popped
+    assert len(freelist.stack) == 4 and len(freelist) == 2 and 6 not in freelist
+    freelist.append(1)  # Above its stale entry
+    assert list(freelist) == [3, 5, 1]
+    assert [freelist.pop() for i in range(3)] == [1, 5, 3] and len(freelist) == 0
+
+
+def first_fit(freelist):
+    # Written against a plain list: the lowest free frame
+    freelist.sort()
+    return freelist.pop(0)
+
+
+def free_to_front(freelist, addr):
+    freelist.insert(0, addr)
+
+
+def test_freelist_supports_index_based_allocators():
+    mem = PhysicalMemory(8)
+    mem.allocate_memory = first_fit
+    mem.free_memory = free_to_front
+    addrs = [mem.alloc(i) for i in range(4)]
+    assert addrs == [0, 1, 2, 3]
+    mem.free(1)
+    assert mem.freelist[0] == 1 and mem.freelist.index(5) == 2
+    assert mem.alloc(9) == 1
+    with pytest.raises(exceptions.FrameDoubleFree):
+        mem.freelist.insert(0, 4)
+    assert list(mem.freelist) == [4, 5, 6, 7]
+
+
+def test_framestore_copies_share_blocks_until_written():
+    frames = FrameStore(3000)
+    frames[5] = 7
+    snapshot = deepcopy(frames)
+    assert snapshot.blocks[0] is frames.blocks[0]
+    frames[5] = 8
+    frames[2999] = 9
+    assert (snapshot[5], snapshot[2999]) == (7, 0)
+    assert (frames[5], frames[2999]) == (8, 9)
+    assert snapshot.blocks[1] is frames.blocks[1]
+    with pytest.raises(IndexError):
+        frames[3000]
+
+
+def test_memory_serializes_base64_and_diff():
+    mem = PhysicalMemory(4)
+    mem.set(1, 300)
+    mem.state.clear_dirty()
+    mem.set(3, -2)
+    data = base64.b64decode(mem.serialize('base64')['memory_b64'])
+    assert struct.unpack('<4q', data) == (0, 300, 0, -2)
+    assert mem.serialize('diff')['memory_diff'] == [[3, -2]]
+    assert mem.serialize()['memory'] == [0, 300, 0, -2]
@@ -1,6 +1,6 @@
 from memory import PhysicalMemory
 from page import PageManager
-from process import Process, load_program, Operation
+from process import Process, Program, load_program, Operation, OP_MALLOC, OP_WRITE, OP_WORK
 from processstate import ProcessState
 import os
 
@@ -31,6 +31,64 @@ def test_process_run_two_segments():
     assert proc.program_counter == 2
 
 
+def test_load_program_is_cached(program_dir):
+    script = program_dir / 'cached.process'
+    script.write_text('work 10\n')
+    first = load_program('cached.process')
+    assert load_program('cached.process') is first
+    script.write_text('work 10\nwork 20\n')
+    os.utime(script, ns=(0, 0))
+    assert tuple(load_program('cached.process')) == ((Operation.WORK, 10, ''), (Operation.WORK, 20, ''))
+
+
+def test_load_program_cache_follows_the_working_directory(tmp_path, monkeypatch):
+    for work in (10, 20):
+        (tmp_path / str(work) / 'programs').mkdir(parents=True)
+        script = tmp_path / str(work) / 'programs' / 'same.process'
+        script.write_text(f'work {work}\n')
+        os.utime(script, ns=(0, 0))
+        monkeypatch.chdir(tmp_path / str(work))
+        assert tuple(load_program('same.process')) == ((Operation.WORK, work, ''),)
+
+
+def test_program_compiles_variables_to_slots():
+    program = Program([(Operation.MALLOC, 'A', ''), (Operation.MALLOC, 'B', ''),
+                       (Operation.WRITE, 'A', 3), (Operation.WORK, 10, '')])
+    assert program.opcodes == bytes([OP_MALLOC, OP_MALLOC, OP_WRITE, OP_WORK])
+    assert program.arg1 == (0, 1, 0, 10)
+    assert program.arg2 == ('', '', 3, '')
+    assert program.varnames == ('A', 'B')
+    assert program[2] == (Operation.WRITE, 'A', 3)
+
+
+def test_process_runs_compiled_program():
+    mem = PhysicalMemory(64)
+    pm = PageManager(mem)
+    proc = Process(pm, 'gcc.process', 1)
+    while proc.state != ProcessState.EXIT:
+        proc.run(100)
+    assert proc.program_counter == len(proc.program)
+    assert all(proc.mem_consistency.values())
+
+
+def test_process_run_batches_work():
+    mem = PhysicalMemory(4)
+    pm = PageManager(mem)
+    proc = Process(pm, '', 1)
+    proc.program = Program([(Operation.WORK, 30, ''), (Operation.WORK, 30, ''), (Operation.WORK, 30, ''),
+                            (Operation.MALLOC, 'A', ''), (Operation.WORK, 50, ''), (Operation.WORK, 0, '')])
+    proc.right_data = [None]
+    assert proc.program.work_end == (3, 3, 3, 3, 6, 6)
+    assert proc.program.work_prefix == (0, 30, 60, 90, 90, 140, 140)
+    assert proc.run(45) == 45
+    assert (proc.program_counter, proc.unfinished_work) == (1, 15)
+    assert proc.run(15) == 15
+    assert (proc.program_counter, proc.unfinished_work) == (2, 0)
+    assert proc.run(40) == 40
+    assert (proc.program_counter, proc.unfinished_work) == (4, 10)
+    assert proc.run(100) == 40
+    assert proc.state == ProcessState.EXIT
+
 # def test_process_execution():
 #     pass
 
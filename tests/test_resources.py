@@ -0,0 +1,54 @@
+from processstate import ProcessState
+from resources import ResourceManager
+from simulator import Simulation
+from tests.conftest import Spec
+
+
+class FakeProcess:
+    def __init__(self, pid):
+        self.pid = pid
+
+
+def test_resources_are_handed_off_in_order():
+    rm = ResourceManager()
+    a, b, c = FakeProcess(0), FakeProcess(1), FakeProcess(2)
+    assert rm.acquire(a, 'disk')
+    assert rm.acquire(a, 'disk')  # Already held
+    assert not rm.acquire(b, 'disk')
+    assert not rm.acquire(c, 'disk')
+    assert rm.serialize() == {'disk': {'holder': 0, 'waiting': [1, 2]}}
+    rm.release(c, 'disk')  # Not held, so nothing happens
+    rm.release(a, 'disk')
+    assert rm.take_woken() == [b] and rm.holders['disk'] is b
+    assert rm.acquire(a, 'tape')
+    rm.release_all(b)
+    assert rm.take_woken() == [c]
+    rm.release_all(c)
+    assert rm.take_woken() == [] and rm.serialize() == {'tape': {'holder': 0, 'waiting': []}}
+
+
+def test_blocked_processes_wait_for_resources():
+    sim = Simulation(memorysize=64)
+    for i in range(3):
+        sim.spawn_process(Spec(f'emacs {i}', 'emacs.process'))
+    sim.spawn_process(Spec('free', 'gcc.process'))
+    blocked_steps = 0
+    holders = []
+    blocked = set()
+    while sim.current.sched.live:
+        sim.step()
+        # Processes that were blocked don't run
+        assert sim.current.pid not in blocked
+        sched = sim.current.sched
+        blocked = {p.pid for p in sched.processes if p.state == ProcessState.BLOCKED}
+        blocked_steps += bool(blocked)
+        assert not blocked & set(sched.ready)
+        resources = sched.serialize()['resources']
+        if 'file_ptr' in resources:
+            assert set(resources['file_ptr']['waiting']) == blocked
+            if not holders or holders[-1] != resources['file_ptr']['holder']:
+                holders.append(resources['file_ptr']['holder'])
+    assert blocked_steps > 0
+    # Waiters got the file in the order they asked for it
+    assert holders == [0, 1, 2]
+    assert sim.current.sched.resources.serialize() == {}
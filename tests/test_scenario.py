@@ -0,0 +1,256 @@
+import io
+import json
+import pytest
+import random
+from encoders import get_encoder
+from history import SerializedCache
+from run_sim import Scenario, ScenarioInstance, SpawnQueue, parse_args, run_headless
+
+
+def busy_steps(instance, until):
+    # Run until the clock passes `until`, returning every step in which a process ran.
+    steps = []
+    while instance.simulation.current.clock < until:
+        instance.step(1)
+        state = instance.simulation.current
+        if state.pid is not None:
+            steps.append(json.dumps(state.serialize(), sort_keys=True))
+    return steps
+
+
+def test_event_driven_matches_fixed_slices():
+    random.seed(3)
+    fixed = ScenarioInstance(Scenario('recurring'))
+    expected = busy_steps(fixed, 20000)
+    random.seed(3)
+    event = ScenarioInstance(Scenario('recurring'), event_driven=True)
+    assert busy_steps(event, 20000) == expected
+    assert len(event.simulation.history) < len(fixed.simulation.history)
+
+
+def test_event_driven_history_replays_gaps():
+    histories = []
+    for keyframe_interval in (1, 4):
+        random.seed(5)
+        instance = ScenarioInstance(Scenario('recurring'), event_driven=True, keyframe_interval=keyframe_interval)
+        instance.step(30)
+        histories.append([json.dumps(x.serialize(), sort_keys=True) for x in instance.simulation.history])
+    assert histories[0] == histories[1]
+
+
+def test_spawn_queue_is_stable_for_same_time():
+    q = SpawnQueue()
+    for t, name in [(5, 'a'), (1, 'b'), (5, 'c'), (1, 'd')]:
+        q.push(t, name)
+    assert q.pop_due(0) is None
+    assert [q.pop_due(5) for i in range(4)] == ['b', 'd', 'a', 'c']
+    assert len(q) == 0
+
+
+def test_short_intervals_catch_up_within_a_step():
+    # 'my process every' is due every 10 ticks from 5, so all 10 are due at clock 100
+    instance = ScenarioInstance(Scenario('example'))
+    instance.step(2)
+    names = [p.name for p in instance.simulation.current.sched.processes]
+    assert names.count('my process every') == 10
+
+
+def apply_delta(base, delta):
+    # What the inspector does with each delta it receives.
+    mem = dict(base['mem'], in_use=delta['mem']['in_use'], memory=list(base['mem']['memory']))
+    for addr, data in delta['mem']['memory_diff']:
+        mem['memory'][addr] = data
+    if 'freelist' in delta['mem']:
+        mem['freelist'] = delta['mem']['freelist']
+    pages = list(base['pagemngr']['pages'])
+    for page in delta['pagemngr']['pages']:
+        pages[page['uid']:page['uid'] + 1] = [page]
+    slots = dict(base['pagemngr']['slots'])
+    for uid, data in delta['pagemngr']['slots'].items():
+        slots.pop(uid, None)
+        if data is not None:
+            slots[uid] = data
+    changed = {x['pid']: x for x in delta['scheduler']['processes']}
+    exited = [x['pid'] for x in delta['scheduler']['exited']]
+    processes = [changed.pop(x['pid'], x) for x in base['scheduler']['processes'] if x['pid'] not in exited]
+    processes += changed.values()
+    return {
+        'clock': delta['clock'], 'time': delta['time'], 'pid': delta['pid'], 'mem': mem,
+        'pagemngr': dict(base['pagemngr'], pages=pages, slots=slots, faults=delta['pagemngr']['faults'],
+                         ttl_faults=delta['pagemngr']['ttl_faults']),
+        'scheduler': {'processes': processes, 'exited': delta['scheduler']['exited'],
+                      'term_count': delta['scheduler']['term_count'],
+                      'resources': delta['scheduler'].get('resources', base['scheduler']['resources']),
+                      'cpus': delta['scheduler']['cpus']},
+    }
+
+
+def test_deltas_rebuild_every_step():
+    random.seed(7)
+    instance = ScenarioInstance(Scenario('round-robin-scenario'), keyframe_interval=7)
+    base = json.loads(instance.serialized_keyframe())['history'][0]
+    for count in [1, 3, 1, 10, 2, 25, 1]:
+        instance.step(count)
+        deltas = json.loads(instance.serialized_delta(count))['history']
+        assert len(deltas) == count
+        history = instance.simulation.history
+        expected = history.after(slice(len(history) - count, len(history)))
+        for delta, state in zip(deltas, expected):
+            base = apply_delta(base, delta)
+            assert base == json.loads(json.dumps(state.serialize()))
+        assert base == json.loads(instance.serialized_keyframe())['history'][0]
+
+
+def test_terminated_processes_are_sent_once():
+    random.seed(9)
+    instance = ScenarioInstance(Scenario('recurring'))
+    exited = []
+    for i in range(200):
+        instance.step(1)
+        exited += json.loads(instance.serialized(1))['history'][0]['scheduler']['exited']
+    table = json.loads(instance.serialized_terminated())
+    assert table['processes'] == exited
+    assert len(exited) == instance.simulation.current.sched.serialize()['term_count'] > 5
+    assert json.loads(instance.serialized_terminated(3))['processes'] == exited[3:]
+    # Copies share terminated processes rather than duplicating them
+    sched = instance.simulation.current.sched
+    assert instance.simulation.history[-1].sched.term_procs[0] is sched.term_procs[0]
+
+
+def test_serialized_history_is_cached():
+    random.seed(11)
+    instance = ScenarioInstance(Scenario('round-robin-scenario'), keyframe_interval=5)
+    instance.step(30)
+    history = instance.simulation.history
+    expected = {'type': 'update', 'history': [x.serialize() for x in history[-9:]]}
+    expected['history'].append(instance.simulation.current.serialize())
+    assert instance.serialized(10) == json.dumps(expected)
+    assert len(history.cache) == 9
+    assert instance.serialized(10) == json.dumps(expected)
+    assert len(history.cache) == 9
+
+
+def test_serialized_cache_evicts_by_size():
+    cache = SerializedCache(10)
+    cache.put('a', '1234')
+    cache.put('b', '5678')
+    cache.get('a')
+    cache.put('c', '90')
+    cache.put('d', '12345678901')
+    assert list(cache.entries) == ['b', 'a', 'c']
+    cache.put('e', '1234')
+    assert list(cache.entries) == ['a', 'c', 'e'] and cache.size == 10
+
+
+def rows(columns):
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def test_columnar_output_matches_rows():
+    random.seed(5)
+    instance = ScenarioInstance(Scenario('round-robin-scenario'), columnar=True)
+    instance.step(20)
+    state = instance.simulation.current
+    columnar = json.loads(instance.serialized())['history'][-1]
+    expected = state.serialize()
+    for page in expected['pagemngr']['pages']:
+        del page['objtype']
+    assert rows(columnar['pagemngr']['pages']) == expected['pagemngr']['pages']
+    assert rows(columnar['scheduler']['processes']) == expected['scheduler']['processes']
+    columnar['pagemngr']['pages'] = expected['pagemngr']['pages']
+    columnar['scheduler']['processes'] = expected['scheduler']['processes']
+    assert columnar == json.loads(json.dumps(expected))
+
+
+def test_encoders_agree_with_json():
+    orjson = pytest.importorskip('orjson')
+    random.seed(5)
+    plain = ScenarioInstance(Scenario('round-robin-scenario'))
+    plain.step(20)
+    random.seed(5)
+    fast = ScenarioInstance(Scenario('round-robin-scenario'), encoder='orjson')
+    fast.step(20)
+    assert orjson.loads(fast.serialized(5)) == json.loads(plain.serialized(5))
+    assert orjson.loads(fast.serialized_delta(3)) == json.loads(plain.serialized_delta(3))
+
+
+def test_msgpack_encoder_builds_messages():
+    msgpack = pytest.importorskip('msgpack')
+    random.seed(5)
+    instance = ScenarioInstance(Scenario('round-robin-scenario'), encoder='msgpack')
+    instance.step(20)
+    message = msgpack.unpackb(instance.serialized(5), strict_map_key=False)
+    assert message['type'] == 'update' and len(message['history']) == 5
+    assert message['history'][-1]['clock'] == instance.simulation.current.clock
+
+
+def test_unknown_encoder():
+    with pytest.raises(ValueError):
+        get_encoder('yaml')
+
+
+def test_headless_trace_replays_steps():
+    random.seed(13)
+    instance = ScenarioInstance(Scenario('recurring'), retention='none')
+    trace = io.StringIO()
+    summary = run_headless(instance, until_clock=5000, trace=trace, deltas=True)
+    random.seed(13)
+    expected = ScenarioInstance(Scenario('recurring'))
+    expected.step(50)
+    lines = [json.loads(x) for x in trace.getvalue().splitlines()]
+    assert len(lines) == 51 and len(instance.simulation.history.journal) == 0
+    base = lines[0]
+    for delta, state in zip(lines[1:], expected.simulation.history.after(slice(None))):
+        base = apply_delta(base, delta)
+        assert base == json.loads(json.dumps(state.serialize()))
+    assert summary['steps'] == 50 and summary['clock'] == 5000
+    assert summary['busy'] + summary['idle'] == 5000
+    assert summary['terminated'] == expected.simulation.current.sched.serialize()['term_count']
+
+
+def test_seeded_instances_are_identical():
+    traces = []
+    for i in range(2):
+        random.seed(i)  # The global random module doesn't matter
+        instance = ScenarioInstance(Scenario('many_recur'), seed=42, retention='none')
+        trace = io.StringIO()
+        run_headless(instance, steps=200, trace=trace)
+        traces.append(trace.getvalue())
+    assert traces[0] == traces[1]
+    other = io.StringIO()
+    run_headless(ScenarioInstance(Scenario('many_recur'), seed=43, retention='none'), steps=200, trace=other)
+    assert other.getvalue() != traces[0]
+
+
+@pytest.mark.parametrize('algorithms', ['algorithm_template', 'algorithms_lru'])
+def test_workers_match_serial_slices(algorithms):
+    traces = []
+    for workers in (None, 4):
+        instance = ScenarioInstance(Scenario('multicore'), seed=5, workers=workers, algorithms=algorithms,
+                                    retention='none')
+        trace = io.StringIO()
+        run_headless(instance, steps=1000, trace=trace)
+        traces.append(trace.getvalue())
+    assert traces[0] == traces[1]
+
+
+def test_instance_overrides_cpu_settings():
+    scenario = Scenario('multicore')
+    assert scenario.cpus == 4 and scenario.work_stealing
+    sched = ScenarioInstance(scenario, cpus=2, work_stealing=False).simulation.current.sched
+    assert len(sched.queues) == 2 and not sched.work_stealing
+
+
+def test_work_stealing_flags_default_to_the_scenario():
+    assert parse_args(['multicore']).work_stealing is None
+    assert parse_args(['multicore', '--work-stealing']).work_stealing is True
+    assert parse_args(['multicore', '--no-work-stealing']).work_stealing is False
+
+
+def test_headless_runs_close_their_thread_pool():
+    instance = ScenarioInstance(Scenario('multicore'), seed=5, workers=2, retention='none')
+    pool = instance.simulation.pool
+    run_headless(instance, steps=10)
+    assert instance.simulation.pool is None
+    with pytest.raises(RuntimeError):
+        pool.submit(int)
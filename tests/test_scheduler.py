@@ -1,5 +1,9 @@
+from algorithms_priority import IndexedHeap
 from process import Scheduler, Process
 from processstate import ProcessState
+import random
+from simulator import Simulation
+from tests.conftest import Spec
 
 class FakeProcess:
     def __init__(self):
@@ -35,3 +39,128 @@ def test_scheduler_switches():
     sched.run(10)
     assert ps2.workdone == 10
     assert ps1.state == ProcessState.DONE
+
+
+def test_round_robin_rotates_ready_processes():
+    sim = Simulation(memorysize=16)
+    for name in 'abc':
+        sim.spawn_process(Spec(name, 'gcc.process'))
+    picked = []
+    for i in range(6):
+        sim.step()
+        picked.append(sim.current.pid)
+    assert picked == [0, 1, 2, 0, 1, 2]
+    sched = sim.current.sched
+    assert list(sched.ready) == [0, 1, 2] and sched.queues[0].running.pid == 2
+
+
+def test_priority_runs_shortest_program_first():
+    sim = Simulation(memorysize=16, algorithms='algorithms_priority')
+    sim.spawn_process(Spec('long', 'two_fifties.process'))
+    sim.spawn_process(Spec('short', '100work.process'))
+    sim.spawn_process(Spec('tie', '100work.process'))
+    order = []
+    while not sim.current.sched.is_idle():
+        sim.step()
+        sched = sim.current.sched
+        # The ready set is exactly the live processes that can run
+        assert set(sched.ready) == {p.pid for p in sched.processes
+                                    if p.state in (ProcessState.READY, ProcessState.RUNNING)}
+        if not order or order[-1] != sim.current.pid:
+            order.append(sim.current.pid)
+    assert order == [1, 2, 0]
+    assert len(sim.current.sched.queues[0].pq) == 0
+
+
+def test_indexed_heap_matches_sorting():
+    rng = random.Random(0)
+    heap = IndexedHeap()
+    expected = {}
+    for i in range(500):
+        if expected and rng.random() < 0.4:
+            process = rng.choice(list(expected.values()))
+            heap.remove(process)
+            del expected[process.pid]
+        else:
+            process = Spec(str(i), '')
+            process.pid = i
+            key = (rng.randrange(50), i)
+            heap.push(key, process)
+            expected[i] = process
+            process.key = key
+        smallest = min(expected.values(), key=lambda x: x.key, default=None)
+        assert heap.peek() is smallest and len(heap) == len(expected)
+
+
+def test_cpus_each_run_a_process_per_slice():
+    sim = Simulation(memorysize=32, cpus=2)
+    for name in 'abcd':
+        sim.spawn_process(Spec(name, '100work.process'))
+    for i in range(4):
+        sim.step()
+        sched = sim.current.sched
+        pids = [x['pid'] for x in sched.serialize()['cpus']]
+        # Processes are spread over the CPUs, and only run on their own
+        assert pids[0] in (0, 2) and pids[1] in (1, 3)
+        assert sim.current.pid == pids[0] and sim.current.time == 100
+    assert [p.cpu for p in sched.processes] == [0, 1, 0, 1]
+    assert sim.current.clock == 400
+
+
+def test_work_stealing_fills_idle_cpus():
+    def run(work_stealing):
+        sim = Simulation(memorysize=32, cpus=2, work_stealing=work_stealing)
+        # b is on its own CPU, and finishes long before a and c on the other
+        for name, script in [('a', '100work.process'), ('b', 'ls.process'), ('c', '100work.process')]:
+            sim.spawn_process(Spec(name, script))
+        for i in range(60):
+            sim.step()
+        return [x[0] for x in sim.current.sched.occupancy]
+
+    assert run(False)[1] is None
+    assert None not in run(True)
+
+
+def test_work_stealing_leaves_a_later_cpus_only_process(program_dir):
+    (program_dir / 'holder.process').write_text('acquire disk\nwork 150\nrelease disk\n')
+    (program_dir / 'waiter.process').write_text('acquire disk\nwork 1000\n')
+    sim = Simulation(memorysize=8, cpus=2, work_stealing=True)
+    sim.spawn_process(Spec('holder', 'holder.process'))
+    sim.spawn_process(Spec('waiter', 'waiter.process'))
+    sim.step()  # The waiter blocks on CPU 1
+    sim.step()  # The holder releases the disk and exits, leaving CPU 0 empty
+    sched = sim.current.sched
+    waiter = sched.live[1]
+    assert not sched.queues[0].ready and list(sched.queues[1].ready) == [1] and waiter.cpu == 1
+    # CPU 1 runs its only process itself, so there's nothing for CPU 0 to steal
+    sim.step()
+    assert sched.occupancy == [[None, 0], [1, 100]] and waiter.cpu == 1
+
+
+def test_pool_commits_slices_without_conflicts():
+    sim = Simulation(memorysize=32, cpus=4, workers=4)
+    for name in 'abcd':
+        sim.spawn_process(Spec(name, '100work.process'))
+    sim.step()  # Processes' pages are all loaded, and they only work
+    sched = sim.current.sched
+    assert (sched.committed, sched.rerun) == (4, 0)
+    sim.close()
+
+
+def test_pool_reruns_reads_after_free(program_dir):
+    (program_dir / 'taker.process').write_text('work 150\nmalloc X\nwrite X 7\n')
+    (program_dir / 'reader.process').write_text('malloc A\nwrite A 5\nfree A\nwork 150\nread A\n')
+
+    def run(workers):
+        sim = Simulation(memorysize=8, cpus=2, workers=workers)
+        sim.spawn_process(Spec('taker', 'taker.process'))
+        sim.spawn_process(Spec('reader', 'reader.process'))
+        reader = sim.current.sched.live[1]
+        for i in range(4):
+            sim.step()
+        sim.close()
+        return reader.mem_consistency
+
+    # The taker, on CPU 0, reuses A's frame just before the reader reads it
+    assert run(None) == {'A': False}
+    assert run(2) == {'A': False}
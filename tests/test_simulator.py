@@ -0,0 +1,71 @@
+import json
+import pytest
+from simulator import Simulation
+from tests.conftest import Spec
+
+
+def dump(state):
+    return json.dumps(state.serialize(), sort_keys=True)
+
+
+def test_history_rebuilds_past_states():
+    sim = Simulation(memorysize=4, keyframe_interval=3)
+    expected = []
+    for i in range(20):
+        if i % 4 == 0:
+            sim.spawn_process(Spec(f'p{i}'))
+        expected.append(dump(sim.current))
+        sim.step()
+    assert len(sim.history) == 20
+    assert [dump(x) for x in sim.history] == expected
+    assert dump(sim.history[7]) == expected[7]
+    assert dump(sim.history[-1]) == expected[-1]
+    assert [dump(x) for x in sim.history[-5:]] == expected[-5:]
+
+
+def test_history_only_copies_keyframes():
+    sim = Simulation(memorysize=4, keyframe_interval=10)
+    sim.spawn_process(Spec('a'))
+    for i in range(25):
+        sim.step()
+    assert sorted(sim.history.keyframes) == [0, 10, 20]
+
+
+def run_with_history(steps, **history):
+    sim = Simulation(memorysize=4, keyframe_interval=5, **history)
+    expected = []
+    for i in range(steps):
+        if i % 3 == 0:
+            sim.spawn_process(Spec(f'p{i}'))
+        expected.append(dump(sim.current))
+        sim.step()
+    return sim, expected
+
+
+def test_history_spill_is_transparent(tmp_path):
+    sim, expected = run_with_history(40, retention='spill', keep_steps=10, spill_path=tmp_path / 'spill')
+    assert min(sim.history.keyframes) >= 25
+    assert sim.history.spilled
+    assert [dump(x) for x in sim.history] == expected
+    assert dump(sim.history[3]) == expected[3]
+    spill_file = sim.history.spill_file
+    sim.close()
+    assert spill_file.closed and sim.history.spill_file is None
+
+
+def test_history_drop_discards_old_steps():
+    sim, expected = run_with_history(40, retention='drop', keep_steps=10)
+    assert len(sim.history) == 40
+    assert [dump(x) for x in sim.history] == expected[sim.history.start:]
+    assert len(sim.history[-15:]) == 40 - sim.history.start >= 10
+    with pytest.raises(IndexError):
+        sim.history[0]
+
+
+def test_history_none_records_nothing():
+    sim, _ = run_with_history(40, retention='none')
+    assert len(sim.history) == 40
+    assert not sim.history.keyframes and not sim.history.journal
+    assert list(sim.history) == []
+    with pytest.raises(IndexError):
+        sim.history[-1]
@@ -0,0 +1,19 @@
+import pytest
+from run_sim import Scenario, ScenarioInstance, run_headless
+from sweep import sweep
+
+TIMING = ('wall_time', 'steps_per_second')
+
+
+def test_sweep_matches_single_runs():
+    rows = sweep(['recurring', 'many'], ['algorithm_template'], [8], [4, 5], jobs=2, steps=100)
+    assert [(x['scenario'], x['seed']) for x in rows] == [('recurring', 4), ('recurring', 5), ('many', 4), ('many', 5)]
+    summary = run_headless(ScenarioInstance(Scenario('many'), memory=8, seed=5, retention='none'), steps=100)
+    row = rows[3]
+    assert row['error'] is None and row['memory'] == 8 and row['algorithm'] == 'algorithm_template'
+    assert {k: row[k] for k in summary if k not in TIMING} == {k: v for k, v in summary.items() if k not in TIMING}
+
+
+def test_sweep_checks_algorithms():
+    with pytest.raises(ModuleNotFoundError):
+        sweep(['simple'], ['no_such_algorithms'], steps=10, jobs=1)
@@ -0,0 +1,65 @@
+import pytest
+import random
+from run_sim import Scenario, ScenarioInstance
+from tracing import open_trace, read_trace
+
+
+def run(path, steps=500, **kwargs):
+    with open_trace(path) as trace:
+        instance = ScenarioInstance(Scenario('multicore'), seed=3, trace=trace, **kwargs)
+        instance.step(steps)
+    return instance, list(read_trace(path))
+
+
+def test_formats_hold_the_same_events(tmp_path):
+    instance, binary = run(tmp_path / 'events.bin')
+    _, jsonl = run(tmp_path / 'events.jsonl.gz')
+    assert binary == jsonl
+    state = instance.simulation.current
+    kinds = [x['event'] for x in binary]
+    assert kinds.count('step') == 500 and kinds[-1] == 'step'
+    assert kinds.count('fault') == state.pagemngr.ttl_faults
+    assert kinds.count('spawn') == state.pidcount
+    assert kinds.count('exit') == len(state.sched.term_procs)
+    assert binary[-1] == {'event': 'step', 'step': 499, 'clock': state.clock, 'time': state.time, 'pid': state.pid}
+
+
+def test_history_replays_are_not_traced(tmp_path):
+    instance, events = run(tmp_path / 'events.bin', keyframe_interval=7)
+    state = instance.simulation.current
+    with open_trace(tmp_path / 'after.bin') as trace:
+        instance.simulation.trace = trace
+        assert state.pagemngr.trace is trace and state.sched.trace is trace
+        # Rebuilds past states from keyframes, which mustn't report anything
+        instance.serialized(100)
+        instance.step(1)
+    after = list(read_trace(tmp_path / 'after.bin'))
+    # Only the events of the one new step
+    assert [x for x in after if x['event'] == 'step'] == [after[-1]] and after[-1]['step'] == 500
+    assert len([x for x in after if x['event'] == 'run']) <= len(state.sched.queues)
+
+
+def test_binary_values_round_trip(tmp_path):
+    rng = random.Random(0)
+    expected = []
+    with open_trace(tmp_path / 'events.bin') as trace:
+        for i in range(2000):
+            values = [rng.choice([None, 0, -1, rng.randrange(-2 ** 40, 2 ** 40)]) for j in range(4)]
+            trace.emit('step', *values)
+            expected.append(dict(zip(['event', 'step', 'clock', 'time', 'pid'], ['step'] + values)))
+        trace.emit('spawn', 1, 0, 'ünïcode', 'x.process')
+    events = list(read_trace(tmp_path / 'events.bin'))
+    assert events[:-1] == expected
+    assert events[-1]['name'] == 'ünïcode'
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        open_trace(tmp_path / 'events', format='csv')
+
+
+def test_truncated_binary_trace_ends_early(tmp_path):
+    _, events = run(tmp_path / 'events.bin', steps=50)
+    data = (tmp_path / 'events.bin').read_bytes()
+    (tmp_path / 'events.bin').write_bytes(data[:-2])
+    assert list(read_trace(tmp_path / 'events.bin')) == events[:-1]
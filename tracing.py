@@ -0,0 +1,233 @@
+from abc import ABC, abstractmethod
+import argparse
+from collections import Counter
+import gzip
+import json
+
+
+"""
+Event traces: what happened during a simulation, written to a file as it
+runs, so that runs of millions of steps can be recorded in bounded memory and
+analysed offline with read_trace().
+
+Each event has a kind and the fields listed in EVENTS:
+    - fault, load, evict, free: The PageManager faulted on, loaded, evicted or
+      freed a page. Loads and evictions also give the frame.
+    - spawn, exit: The Scheduler admitted a process onto a CPU, or it terminated.
+    - run: What a CPU ran for the slice, and for how long, after the events
+      of running it. Idle CPUs have none.
+    - block, wake: A process blocked on a resource, or got it.
+    - steal: A CPU took a waiting process from another (source) CPU.
+    - step: The end of a step, with its index, the clock after it, how long it
+      took and the pid of Simulation.current. A step's events, including the
+      spawns made just before it, come before its step event.
+
+There are two formats:
+    - 'binary': A header, then one record per event: its length as a varint,
+      the kind's index in the header's schema and each field, as zigzag varints
+      for ints (shifted up by one so that 0 is None) and length-prefixed UTF-8
+      for strings. Most events take 3 to 6 bytes.
+    - 'jsonl.gz': One JSON object per line, like {"event": "fault", "page": 3},
+      gzipped.
+
+Only a Simulation's current state traces. Copies, like History's keyframes
+and the states it replays, don't.
+"""
+
+EVENTS = {
+    'fault': ('page',),
+    'load': ('page', 'addr'),
+    'evict': ('page', 'addr'),
+    'free': ('page',),
+    'spawn': ('pid', 'cpu', 'name', 'script'),
+    'exit': ('pid', 'cpu'),
+    'run': ('cpu', 'pid', 'time'),
+    'block': ('pid', 'cpu'),
+    'wake': ('pid',),
+    'steal': ('pid', 'source', 'cpu'),
+    'step': ('step', 'clock', 'time', 'pid'),
+}
+STRINGS = {'name', 'script'}  # Fields that are strings, rather than ints
+MAGIC = b'AOSTRACE'
+VERSION = 1
+
+
+class TraceWriter(ABC):
+    @abstractmethod
+    def emit(self, kind, *values):
+        # Record an event of the given kind, with values for each of its fields.
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __deepcopy__(self, memo):
+        # Copies of the simulation's state don't trace.
+        return None
+
+
+def _uvarint(out, n):
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_uvarint(data, i):
+    # Returns the varint at data[i], and the index after it.
+    n = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, i
+        shift += 7
+
+
+class BinaryTraceWriter(TraceWriter):
+    format = 'binary'
+
+    """
+    :param flush_bytes: How many bytes of records to buffer before writing them.
+    """
+    def __init__(self, path, flush_bytes=1 << 16):
+        self.file = open(path, 'wb')
+        self.flush_bytes = flush_bytes
+        self.kinds = {kind: i for i, kind in enumerate(EVENTS)}
+        self.strings = {kind: [x in STRINGS for x in fields] for kind, fields in EVENTS.items()}
+        self.buffer = bytearray()
+        schema = json.dumps({'version': VERSION, 'events': EVENTS, 'strings': sorted(STRINGS)}).encode()
+        header = bytearray(MAGIC)
+        _uvarint(header, len(schema))
+        self.file.write(bytes(header) + schema)
+
+    def emit(self, kind, *values):
+        record = bytearray((self.kinds[kind],))
+        for value, string in zip(values, self.strings[kind]):
+            if string:
+                value = value.encode()
+                _uvarint(record, len(value))
+                record += value
+            elif value is None:
+                record.append(0)
+            else:
+                _uvarint(record, ((value << 1) ^ (value >> 63)) + 1)
+        _uvarint(self.buffer, len(record))
+        self.buffer += record
+        if len(self.buffer) >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class JSONLTraceWriter(TraceWriter):
+    format = 'jsonl.gz'
+
+    def __init__(self, path, compresslevel=6):
+        self.file = gzip.open(path, 'wt', compresslevel=compresslevel)
+
+    def emit(self, kind, *values):
+        obj = {'event': kind}
+        obj.update(zip(EVENTS[kind], values))
+        self.file.write(json.dumps(obj) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+WRITERS = {x.format: x for x in (BinaryTraceWriter, JSONLTraceWriter)}
+
+
+"""
+Open a TraceWriter for path.
+:param format: 'binary' or 'jsonl.gz'. By default, paths ending in .gz are
+               gzipped JSON lines, and anything else binary.
+"""
+def open_trace(path, format=None):
+    if format is None:
+        format = 'jsonl.gz' if str(path).endswith('.gz') else 'binary'
+    if format not in WRITERS:
+        raise ValueError(f"Unknown trace format '{format}'. Choose from: {', '.join(WRITERS)}.")
+    return WRITERS[format](path)
+
+
+def _read_length(f):
+    # Read the varint at f's position, or return None at the end of the file.
+    n = shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        n |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return n
+        shift += 7
+
+
+def _read_binary(f):
+    # Records are read one at a time, so memory use doesn't grow with the trace.
+    # A record cut short, e.g. because the run crashed before the writer was closed, ends it.
+    f.read(len(MAGIC))
+    schema = json.loads(f.read(_read_length(f)))
+    if schema['version'] != VERSION:
+        raise ValueError(f"Unsupported trace version {schema['version']}.")
+    kinds = list(schema['events'].items())
+    strings = set(schema['strings'])
+    while True:
+        length = _read_length(f)
+        if length is None:
+            return
+        record = f.read(length)
+        if len(record) < length:
+            return
+        kind, fields = kinds[record[0]]
+        obj = {'event': kind}
+        i = 1
+        for field in fields:
+            n, i = _read_uvarint(record, i)
+            if field in strings:
+                obj[field] = record[i:i + n].decode()
+                i += n
+            elif n == 0:
+                obj[field] = None
+            else:
+                n -= 1
+                obj[field] = (n >> 1) ^ -(n & 1)
+        yield obj
+
+
+"""
+Yield the events in a trace of either format, as dicts like those in the
+jsonl.gz format.
+"""
+def read_trace(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            f.seek(0)
+            yield from _read_binary(f)
+            return
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize an event trace written by run_sim.py --events.')
+    parser.add_argument('path')
+    args = parser.parse_args()
+    counts = Counter(x['event'] for x in read_trace(args.path))
+    print(json.dumps(dict(counts), indent=2))